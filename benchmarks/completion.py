@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# ruff: noqa: T201
+"""
+    Time the branch prompt's completion index on synthetic branch names.
+
+    Generates names shaped like odoo-dev's ('saas-17.2-stock-fix-abc'),
+    builds a `NameIndex` and reports the time per keystroke for typical
+    queries, next to the linear filtering the prompt did before.
+
+    Usage: python benchmarks/completion.py [-n NAMES] [--repeat R]
+"""
+
+import argparse
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).absolute().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from completion import NameIndex  # noqa: E402
+
+VERSIONS = ("15.0", "16.0", "17.0", "18.0", "saas-17.1", "saas-17.2", "saas-17.4", "saas-18.1", "master")
+WORDS = (
+    "fix", "stock", "move", "account", "invoice", "website", "sale", "purchase", "mrp", "pos",
+    "imp", "perf", "l10n", "hr", "payroll", "crm", "mail", "web", "report", "tax",
+)
+
+
+def synthetic_names(count, seed=1):
+    rng = random.Random(seed)
+    handles = ["".join(rng.choices(string.ascii_lowercase, k=rng.choice((3, 4)))) for _idx in range(800)]
+    return [
+        f"{rng.choice(VERSIONS)}-{'-'.join(rng.sample(WORDS, rng.randint(1, 4)))}-{rng.choice(handles)}"
+        for _idx in range(count)
+    ], handles
+
+
+def per_call_ms(func, repeat):
+    start = time.perf_counter()
+    for _idx in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=100000, help="Number of branch names")
+    parser.add_argument("--repeat", type=int, default=100, help="Searches per query")
+    args = parser.parse_args()
+
+    names, handles = synthetic_names(args.n)
+    start = time.perf_counter()
+    index = NameIndex(names)
+    print(f"Indexed {len(index.names)} names in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    queries = ("1", "17.0-", "saas-", "saas-17.2 stock", "fix", handles[0], f"17.0 stock {handles[1][:2]}", "zzz")
+    print(f"{'query':<20} {'index':>10} {'linear':>10} {'matches':>8}")
+    print(60 * '-')
+    for query in queries:
+        indexed = per_call_ms(lambda query=query: index.search(query), args.repeat)
+        linear = per_call_ms(lambda query=query: [x for x in names if query.lower() in x.lower()], max(1, args.repeat // 20))
+        print(f"{query!r:<20} {indexed:>7.3f} ms {linear:>7.2f} ms {len(index.search(query)):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# ruff: noqa: T201
+"""
+    Compare `ocli` command latency with and without the background server.
+
+    Runs each command N times in a scratch project, first locally
+    (ODEV_NO_DAEMON=1) then through `ocli daemon start`, and reports
+    the median wall time next to the bare interpreter startup.
+
+    Usage: python benchmarks/daemon.py [-n N]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).absolute().parent.parent
+MAIN = ROOT / "src" / "__main__.py"
+COMMANDS = (
+    ("path", "venv"),
+    ("workspace", "last-used"),
+    ("git", "status"),
+)
+
+
+def median_ms(args, cwd, env, repeat):
+    timings = []
+    for _i in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(args, cwd=cwd, env=env, capture_output=True, check=False)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=10, help="Repetitions per command")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home, tempfile.TemporaryDirectory() as project:
+        env = {**os.environ, "HOME": home, "PYTHONPATH": str(ROOT / "src")}
+        local_env = {**env, "ODEV_NO_DAEMON": "1"}
+        subprocess.run([sys.executable, str(MAIN), "project-create"],
+                       cwd=project, env=env, capture_output=True, check=False)
+
+        print(f"{'command':<24} {'local':>10} {'daemon':>10}")
+        print(80 * '-')
+        bare = median_ms([sys.executable, "-c", "pass"], project, env, args.n)
+        print(f"{'(python -c pass)':<24} {bare:>7.1f} ms")
+
+        local = {x: median_ms([sys.executable, str(MAIN), *x], project, local_env, args.n) for x in COMMANDS}
+        subprocess.run([sys.executable, str(MAIN), "daemon", "start"],
+                       cwd=project, env=local_env, capture_output=True, check=True)
+        try:
+            for command in COMMANDS:
+                remote = median_ms([sys.executable, str(MAIN), *command], project, env, args.n)
+                print(f"{' '.join(command):<24} {local[command]:>7.1f} ms {remote:>7.1f} ms")
+        finally:
+            subprocess.run([sys.executable, str(MAIN), "daemon", "stop"],
+                           cwd=project, env=env, capture_output=True, check=False)
+
+
+if __name__ == "__main__":
+    main()
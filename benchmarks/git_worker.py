@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# ruff: noqa: T201
+"""
+    Compare revision lookups through a fresh git process with the
+    per-repository `git cat-file --batch-check` worker.
+
+    Builds a synthetic repository with many files, commits and remote
+    branches (packed, like in a fetched odoo clone), then times N lookups
+    of each kind both ways.
+
+    Usage: python benchmarks/git_worker.py [-n N] [--files F] [--refs R] [--commits C]
+"""
+
+import argparse
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).absolute().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from git import MERGE_BASES, Git, RepoWorker  # noqa: E402
+
+
+def fast_import_stream(files, commits, refs):
+    """ Commits on master touching a slice of `files` each, and `refs` remote branches on them """
+    lines = []
+    for commit in range(1, commits + 1):
+        lines += [
+            "commit refs/heads/master",
+            f"mark :{commit}",
+            f"committer bench <bench@example.com> {1700000000 + commit} +0000",
+            "data 8", f"c{commit:06}",
+        ]
+        if commit > 1:
+            lines.append(f"from :{commit - 1}")
+        step = max(1, files // commits)
+        for idx in range(0 if commit == 1 else (commit * step) % files, files if commit == 1 else (commit * step) % files + 1):
+            content = f"{idx} {commit}\n"
+            lines += [f"M 100644 inline addons/mod{idx % 500}/file{idx}.py", f"data {len(content)}", content.rstrip("\n")]
+    for ref in range(refs):
+        lines += [f"reset refs/remotes/origin/branch-{ref}", f"from :{random.randint(1, commits)}"]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def build(path, files, commits, refs):
+    subprocess.run(["git", "init", "-q", "-b", "master", str(path)], check=True)
+    subprocess.run(["git", "fast-import", "--quiet"], cwd=path, input=fast_import_stream(files, commits, refs), check=True)
+    subprocess.run(["git", "checkout", "-q", "master"], cwd=path, check=True)
+    subprocess.run(["git", "pack-refs", "--all"], cwd=path, check=True)
+    subprocess.run(["git", "gc", "-q"], cwd=path, check=True)
+
+
+def timed(func, queries):
+    start = time.perf_counter()
+    for query in queries:
+        func(query)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=200, help="Lookups of each kind")
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--refs", type=int, default=5000)
+    parser.add_argument("--commits", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp)
+        print(f"Building a repository with {args.files} files, {args.commits} commits, {args.refs} refs...")
+        build(path, args.files, args.commits, args.refs)
+
+        refs = [f"origin/branch-{random.randrange(args.refs)}" for _idx in range(args.n)]
+        pairs = [("master", random.choice(refs[:10])) for _idx in range(args.n)]
+
+        def fork_rev_parse(rev):
+            return Git.sync(Git.git_async(["rev-parse", "--verify", "-q", rev], path)).stdout.strip()
+
+        def fork_current_branch(_query):
+            return Git.sync(Git.git_async(["branch", "--show-current"], path)).stdout.strip()
+
+        def fork_merge_base(pair):
+            return Git.sync(Git.git_async(["merge-base", *pair], path)).stdout.strip()
+
+        assert fork_rev_parse(refs[0]) == Git.rev_parse(path, refs[0])
+        RepoWorker.close_all()
+        MERGE_BASES.clear()
+
+        rows = [
+            ("resolve ref", timed(fork_rev_parse, refs), timed(lambda rev: Git.rev_parse(path, rev), refs)),
+            ("current branch", timed(fork_current_branch, refs), timed(lambda _q: Git.get_current_branch(path), refs)),
+            ("merge base", timed(fork_merge_base, pairs), timed(lambda pair: Git.merge_base(path, *pair), pairs)),
+        ]
+        print(f"{'lookup':<16} {'fork':>10} {'worker':>10} {'speedup':>8}")
+        print(60 * '-')
+        for name, fork, worker in rows:
+            print(f"{name:<16} {fork:>7.3f} ms {worker:>7.3f} ms {fork / worker:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# ruff: noqa: T201
+"""
+    Summarise `python -X importtime` for the `ocli` entry point.
+
+    For each subcommand group, runs `ocli <group> --help` in a scratch
+    project and reports the total import time, the number of imported
+    modules and which heavy dependencies got pulled in.
+
+    Usage: python benchmarks/importtime.py [--top N] [group ...]
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).absolute().parent.parent
+MAIN = ROOT / "src" / "__main__.py"
+GROUPS = ("db", "path", "git", "workspace", "slot", "odoo")
+HEAVY = ("questionary", "prompt_toolkit", "requests", "rich", "invoke")
+PATTERN = re.compile(r"import time:\s+(?P<own>\d+) \|\s+(?P<cumulative>\d+) \|(?P<indent>\s+)(?P<name>\S+)")
+
+
+def importtime(args, cwd, env):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", str(MAIN), *args],
+        cwd=cwd, env=env, capture_output=True, text=True, check=False,
+    )
+    modules = []
+    for line in proc.stderr.splitlines():
+        if match := PATTERN.match(line):
+            modules.append((
+                match.group("name"),
+                int(match.group("own")),
+                int(match.group("cumulative")),
+                len(match.group("indent")) == 1,
+            ))
+    return modules
+
+
+def summarise(label, modules, top):
+    total = sum(cumulative for _name, _own, cumulative, toplevel in modules if toplevel)
+    names = {name.split('.')[0] for name, *_ in modules}
+    heavy = ','.join(x for x in HEAVY if x in names) or '-'
+    print(f"{label:<20} {total / 1000:>9.1f} ms {len(modules):>6} modules   heavy: {heavy}")
+    if top:
+        for name, own, _cumulative, _toplevel in sorted(modules, key=lambda x: -x[1])[:top]:
+            print(f"    {own / 1000:>8.1f} ms  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("groups", nargs="*", default=GROUPS)
+    parser.add_argument("--top", type=int, default=0, help="Show the N most expensive modules")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home, tempfile.TemporaryDirectory() as project:
+        env = {**os.environ, "HOME": home, "PYTHONPATH": str(ROOT / "src")}
+        subprocess.run([sys.executable, str(MAIN), "project-create"],
+                       cwd=project, env=env, capture_output=True, check=False)
+        print(f"{'command':<20} {'imports':>12} {'count':>6}")
+        print(80 * '-')
+        summarise("(startup)", importtime(["--version"], project, env), args.top)
+        for group in args.groups:
+            summarise(group, importtime([group, "--help"], project, env), args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# ruff: noqa: T201
+"""
+    Push many lines of output through `pl.run` and report how much CPU
+    the live renderer uses, compared to the whole run.
+
+    The live view is drawn on a terminal-like console writing to /dev/null,
+    so the figures don't depend on the terminal being used.
+
+    Usage: python benchmarks/render.py [--lines N] [--commands N]
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+from rich.console import Console
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent / "src"))
+import pl  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=1_000_000, help="Total lines of output")
+    parser.add_argument("--commands", type=int, default=8, help="Parallel commands sharing the lines")
+    args = parser.parse_args()
+
+    frames, render_cpu = 0, 0.0
+    render = pl.render
+
+    def timed_render(commands, live):
+        nonlocal frames, render_cpu
+        start = time.process_time()
+        render(commands, live)
+        render_cpu += time.process_time() - start
+        frames += 1
+
+    pl.render = timed_render
+    per_command = args.lines // args.commands
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        console = Console(file=devnull, force_terminal=True, width=120)
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        # unbuffered, so that output arrives in many small chunks like chatty commands do
+        command = f"{sys.executable} -u -c 'for idx in range({per_command}): print(idx)'"
+        pl.run(*[command] * args.commands, header=False, summary=False, console=console)
+        wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+    print(f"lines:          {per_command * args.commands:>12,}")
+    print(f"wall time:      {wall:>12.2f} s")
+    print(f"run cpu time:   {cpu:>12.2f} s")
+    print(f"render cpu:     {render_cpu:>12.2f} s in {frames} frames")
+    print(f"lines/s:        {per_command * args.commands / wall:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
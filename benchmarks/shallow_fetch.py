@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# ruff: noqa: T201
+"""
+    Compare fetching a bundle's branches in full with a shallow fetch deepened
+    only as far as the merge base needs.
+
+    Builds a bare repository standing in for the remote: master with C commits
+    touching F files each, a version branch forked from it, and a feature branch
+    on the version. Then, in fresh repositories, fetches the version and feature
+    branches both ways over file://, and finds the merge base `bundle` diffs against.
+    Bytes are those of the packs received, kept whole with transfer.unpackLimit=1.
+
+    Usage: python benchmarks/shallow_fetch.py [--commits C] [--files F] [--depth D]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+ROOT = Path(__file__).absolute().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+import paths  # noqa: E402
+from git import MERGE_BASES, FetchPlan, Git, RepoWorker  # noqa: E402
+
+
+def fast_import_stream(commits, files):
+    """ master, `17.0` forked at 3/4 of its history with its own commits, `17.0-fix` with 3 more """
+    lines, mark = [], 0
+
+    def commit(ref, parent, touched, message):
+        nonlocal mark
+        mark += 1
+        lines.extend([
+            f"commit {ref}", f"mark :{mark}",
+            f"committer bench <bench@example.com> {1700000000 + mark} +0000",
+            f"data {len(message)}", message,
+        ])
+        if parent:
+            lines.append(f"from :{parent}")
+        for idx in touched:
+            content = f"{idx} {mark} " + "x" * 200 + "\n"
+            lines.extend([f"M 100644 inline addons/mod{idx % 200}/file{idx}.py", f"data {len(content)}", content.rstrip("\n")])
+        return mark
+
+    parent = None
+    for number in range(commits):
+        parent = commit("refs/heads/master", parent, range(files) if not number else range(number % files, files, 97), f"m{number}")
+        if number == commits * 3 // 4:
+            fork = parent
+    version = fork
+    for number in range(commits // 4):
+        version = commit("refs/heads/17.0", version, range(number % files, files, 89), f"v{number}")
+    feature = version
+    for number in range(3):
+        feature = commit("refs/heads/17.0-fix", feature, [number], f"f{number}")
+    return ("\n".join(lines) + "\n").encode()
+
+
+def build_remote(path, commits, files):
+    subprocess.run(["git", "init", "-q", "--bare", str(path)], check=True)
+    subprocess.run(["git", "fast-import", "--quiet"], cwd=path, input=fast_import_stream(commits, files), check=True)
+    subprocess.run(["git", "gc", "-q"], cwd=path, check=True)
+
+
+def fetch_and_merge_base(remote, path, depth=None):
+    """ (seconds, bytes received, merge base) of fetching the bundle's branches into a fresh repository """
+    subprocess.run(["git", "init", "-q", str(path)], check=True)
+    subprocess.run(["git", "remote", "add", "origin", f"file://{remote}"], cwd=path, check=True)
+    subprocess.run(["git", "config", "transfer.unpackLimit", "1"], cwd=path, check=True)
+    RepoWorker.close_all()
+    MERGE_BASES.clear()
+    objects = path / ".git" / "objects"
+    before = paths.disk_usage(objects)
+    start = time.perf_counter()
+    Git.sync(FetchPlan(depth=depth).add("odoo", "origin", "17.0", "17.0-fix").fetch_async({"odoo": path}))
+    merge_base = Git.merge_base(path, "origin/17.0", "origin/17.0-fix")
+    return time.perf_counter() - start, paths.disk_usage(objects) - before, merge_base
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--commits", type=int, default=2000)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--depth", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, patch.dict(os.environ, {"HOME": tmp}):
+        tmp = Path(tmp)
+        print(f"Building a remote with {args.commits} commits on master over {args.files} files...")
+        build_remote(tmp / "remote.git", args.commits, args.files)
+
+        full = fetch_and_merge_base(tmp / "remote.git", tmp / "full")
+        shallow = fetch_and_merge_base(tmp / "remote.git", tmp / "shallow", depth=args.depth)
+        assert full[2] == shallow[2], "the merge base differs"
+
+        print(f"{'fetch':<20} {'time':>10} {'received':>12}")
+        print(50 * "-")
+        for name, (seconds, size, _merge_base) in (("full", full), (f"shallow, depth={args.depth}", shallow)):
+            print(f"{name:<20} {seconds:>8.2f} s {size / 2**20:>8.2f} MiB")
+        print(f"{'ratio':<20} {full[0] / shallow[0]:>9.1f}x {full[1] / max(shallow[1], 1):>11.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,22 @@
 #!/usr/bin/env python
 
-import typer.core
-typer.core.rich = None
+import os
+import sys
+
+# answer TAB presses from the project's completion index, without loading the commands
+if os.environ.get('_OCLI_COMPLETE'):
+    import completion
+    if (exit_code := completion.answer()) is not None:
+        sys.exit(exit_code)
 
-# load the commands in memory
-import commands  # noqa: E402, F401
+# hand over to the background server, if there's one listening
+import client
+if (exit_code := client.forward()) is not None:
+    sys.exit(exit_code)
+
+import typer.core  # noqa: E402
+typer.core.rich = None
 
-# start the command handling
+# start the command handling, command modules are imported when dispatched
 from odev import odev  # noqa: E402
 odev()
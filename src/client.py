@@ -0,0 +1,75 @@
+"""
+    Thin client that forwards an `ocli` invocation (argv, cwd, environment
+    and the standard file descriptors, so the tty too) to the background
+    server in `daemon.py`, if one is listening.
+
+    Only the standard library is imported here, to keep it cheap.
+"""
+
+import json
+import os
+import signal
+import socket
+import sys
+from pathlib import Path
+
+import consts
+
+
+def socket_path():
+    return Path.home() / '.config' / consts.APPNAME / 'daemon.sock'
+
+
+def pid_path():
+    return socket_path().with_suffix('.pid')
+
+
+def connect(path=None):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(path or socket_path()))
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def send(conn, **kwargs):
+    conn.sendall(json.dumps(kwargs).encode() + b'\n')
+
+
+def receive(stream):
+    line = stream.readline()
+    return json.loads(line) if line else None
+
+
+def forward(argv=None):
+    """
+        Run the command on the server and return its exit code.
+        Returns None when no server is available, so the caller can run it locally.
+    """
+    if os.environ.get('ODEV_NO_DAEMON') or not (sock := connect()):
+        return None
+    with sock, sock.makefile('rb') as stream:
+        try:
+            socket.send_fds(sock, [b'\0'], [0, 1, 2])
+            send(
+                sock,
+                argv=sys.argv[1:] if argv is None else argv,
+                prog_name=Path(sys.argv[0]).name,
+                cwd=os.getcwd(),
+                env=dict(os.environ),
+            )
+            if not (started := receive(stream)):
+                return None
+        except OSError:
+            return None
+
+        # The command runs in another session, relay the signals we get
+        def relay(signum, _frame):
+            os.kill(started['pid'], signum)
+        for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP):
+            signal.signal(signum, relay)
+
+        finished = receive(stream)
+        return finished['exit'] if finished else 1
@@ -1,17 +1,19 @@
-from . import (
-    db,
-    path,
-    slot,
-    workspace,
-    git,
-    odoo,
-)
+import importlib
 
+# Command modules are imported on demand by `odev.LazyGroup`,
+# importing them here would defeat the lazy loading.
 __all__ = [
-    db,
-    path,
-    slot,
-    workspace,
-    git,
-    odoo,
+    'db',
+    'path',
+    'slot',
+    'workspace',
+    'git',
+    'odoo',
+    'daemon',
 ]
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
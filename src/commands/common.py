@@ -1,17 +1,14 @@
 # ruff: noqa: T201
 
 import sys
-from itertools import product
 from json import JSONDecodeError
 from pathlib import Path
 
-from typer import Argument
+from typer import Argument, BadParameter, Context, Option
 
-import pl
-import tools
 from odev import odev
 from templates import origins
-from workspace import Workspace
+from workspace import Workspace, cleanup_colon
 
 
 helps = dict(
@@ -23,18 +20,28 @@ helps = dict(
     repos_csv="CSV list of repositories",
     venv_path="Virtualenv path",
     workspace_name="Name of the workspace that holds the database information, omit to use current",
+    jobs="Max parallel jobs, as N and/or per resource class, i.e. '8,network=2,disk=4'",
+    json="Print one JSON object per command result instead of the live view",
+    timeout="Seconds before a command is killed, as N and/or per resource class, i.e. 'network=120', 0 to disable",
+    fail_fast="Cancel all the commands as soon as one fails",
+    warmup="Precompile the bytecode in the background: all, modules (the workspace's and their dependencies) or none",
 )
 
 
-def set_target(workspace_name: str | None = None):
+def set_target(workspace_name: str | None = None, ctx: Context = None):
+    if ctx and ctx.resilient_parsing:
+        # shell completion, don't prompt nor load anything
+        return workspace_name
     if not workspace_name:
+        # only import `tools` when prompting
+        import tools
         workspace_name = tools.select_workspace("select (default=last)", odev.project)
     elif workspace_name == 'last':
         if not odev.project:
             sys.exit('Project not found')
         workspace_name = odev.project.last_used
     else:
-        workspace_name = tools.cleanup_colon(workspace_name)
+        workspace_name = cleanup_colon(workspace_name)
     workspace_file = odev.paths.workspace_file(workspace_name)
     if not workspace_file.exists():
         sys.exit(f"Workspace file {workspace_file} doesn't exist")
@@ -43,9 +50,9 @@ def set_target(workspace_name: str | None = None):
     except (OSError, ValueError, JSONDecodeError) as e:
         sys.exit(f"Cannot load {workspace_file}, {e}")
     if odev.workspace:
-        odev.workspace.set_path(odev.paths.project)
+        odev.workspace.set_path(odev.paths.root(workspace_name))
         for repo_name, repo in odev.workspace.repos.items():
-            if str(odev.paths.starting).startswith(str(odev.paths.relative('') / repo_name)):
+            if str(odev.paths.starting).startswith(str(odev.paths.repo(repo_name))):
                 odev.repo = repo
                 break
     if workspace_name not in odev.workspaces:
@@ -54,61 +61,132 @@ def set_target(workspace_name: str | None = None):
     return workspace_name
 
 
-def WorkspaceNameArgument(*args, default='last', **kwargs):
+# Shell completion, answered from `odev.index` without spawning processes.
+# `completion.answer` finds them by their name, `complete_<kind>` completes `odev.index.names(kind)`.
+
+def complete_workspaces(incomplete: str | None = None):
+    if not odev.project:
+        return []
+    return [x for x in odev.index.names('workspaces') if x.startswith(incomplete or '')]
+
+
+def complete_branches(incomplete: str | None = None):
+    if not odev.project:
+        return []
+    return [x for x in odev.index.names('branches') if x.startswith(incomplete or '')]
+
+
+def complete_db_names(incomplete: str | None = None):
+    if not odev.project:
+        return []
+    return [x for x in odev.index.names('db_names') if x.startswith(incomplete or '')]
+
+
+def configure_jobs(ctx: Context, jobs: str | None = None):
+    if jobs and not ctx.resilient_parsing:
+        import pl
+        try:
+            pl.configure(jobs)
+        except ValueError as e:
+            raise BadParameter(str(e)) from e
+    return jobs
+
 
-    def workspaces_yield(incomplete: str | None = None):
-        return [workspace_name for workspace_name in odev.workspaces if workspace_name.startswith(workspace_name)]
+def JobsOption(**kwargs):
+    return Option(None, **{
+        **kwargs,
+        'help': helps['jobs'],
+        'callback': configure_jobs,
+    })
+
+
+def configure_json(ctx: Context, json_output: bool = False):
+    if json_output and not ctx.resilient_parsing:
+        import pl
+        pl.JSON_OUTPUT = True
+    return json_output
+
+
+def JsonOption(**kwargs):
+    return Option(False, '--json', **{
+        **kwargs,
+        'help': helps['json'],
+        'callback': configure_json,
+    })
 
+
+def configure_timeout(ctx: Context, timeout: str | None = None):
+    if timeout and not ctx.resilient_parsing:
+        import pl
+        try:
+            pl.configure_timeouts(timeout)
+        except ValueError as e:
+            raise BadParameter(str(e)) from e
+    return timeout
+
+
+def TimeoutOption(**kwargs):
+    return Option(None, **{
+        **kwargs,
+        'help': helps['timeout'],
+        'callback': configure_timeout,
+    })
+
+
+def configure_fail_fast(ctx: Context, fail_fast: bool = False):
+    if fail_fast and not ctx.resilient_parsing:
+        import pl
+        pl.FAIL_FAST = True
+    return fail_fast
+
+
+def FailFastOption(**kwargs):
+    return Option(False, '--fail-fast', **{
+        **kwargs,
+        'help': helps['fail_fast'],
+        'callback': configure_fail_fast,
+    })
+
+
+def WorkspaceNameArgument(*args, default='last', **kwargs):
     return Argument(*args, **{
         **kwargs,
         'help': helps['workspace_name'],
         'callback': set_target,
         'default': default,
-        'autocompletion': workspaces_yield,
+        'autocompletion': complete_workspaces,
     })
 
 
 @odev.command()
 def update_merge_base_cache(
-    workspace_name: str | None = WorkspaceNameArgument()
+    workspace_name: str | None = WorkspaceNameArgument(),
+    jobs: str | None = JobsOption(),
+    timeout: str | None = TimeoutOption(),
+    fail_fast: bool = FailFastOption(),
+    json_output: bool = JsonOption(),
 ):
     """
-        Update the merge base cache
+        Update the merge base cache, for the versions whose tip moved
     """
+    import pl
+    import tools
+    from git import FetchPlan
+
     have_dev_origin = [k for k, v in origins.items() if 'dev' in v]
     repos = {
         repo_name: repo
         for repo_name, repo in odev.workspace.repos.items()
         if repo_name in have_dev_origin
     }
-    pl.run(
-        "git -C {path} fetch {remote} {branch}",
-        repos=repos,
-    )
-    pl.run(
-        "git -C {path} fetch origin {version}",
-        repos=repos,
-        versions=odev.merge_cache.versions,
-    )
-    keys = [
-        f"{repo_name}/{version}"
-        for repo_name, version in product(repos, odev.merge_cache.versions)
-    ]
-    hashes = [
-        clean_line
-        for line in pl.run(
-            "git -C {path} merge-base origin/master origin/{version}",
-            repos=repos,
-            versions=odev.merge_cache.versions,
-            output=False,
-        ).splitlines()
-        if (clean_line := line.rstrip())
-    ]
-    results = dict(zip(keys, hashes))
-    for key, merge_base in results.items():
-        repo, version = key.split('/')
-        getattr(odev.merge_cache, repo)[merge_base] = version
-    odev.merge_cache.save_json(odev.paths.cache)
+    plan = FetchPlan()
+    for repo_name, repo in repos.items():
+        plan.add(repo_name, repo.remote, repo.branch)
+        plan.add(repo_name, 'origin', 'master', *odev.merge_cache.versions)
+    pl.run(plan.stages(), repos=repos, check=True)
+    tools.index_branches(repos)
+    updated = tools.update_merge_cache({repo_name: repo.path for repo_name, repo in repos.items()})
+    pl.echo(f"Fork points of {updated} moved versions computed")
 
 
 @odev.command()
@@ -119,6 +197,8 @@ def project_create(
     """
         Create a project for the current directory
     """
+    import tools
+
     if project_path:
         project_path = Path(project_path).absolute()
     else:
@@ -0,0 +1,74 @@
+# ruff: noqa: T201
+
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import client
+from odev import odev
+
+
+def _pid():
+    try:
+        return int(client.pid_path().read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+
+
+def _running():
+    if sock := client.connect():
+        sock.close()
+        return _pid()
+    return None
+
+
+@odev.daemon.command()
+def start(timeout: float = 5.0):
+    """
+        Start the background server, so that next commands skip Python startup and state loading.
+    """
+    if pid := _running():
+        print(f"Daemon already running (pid {pid})")
+        return
+    log_path = client.socket_path().with_suffix('.log')
+    with open(log_path, 'a', encoding='utf-8') as log:
+        subprocess.Popen(
+            [sys.executable, str(Path(__file__).parent.parent / 'daemon.py')],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=log,
+            start_new_session=True,
+        )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if pid := _running():
+            print(f"Daemon started (pid {pid}), logging to {log_path}")
+            return
+        time.sleep(0.05)
+    sys.exit(f"Daemon didn't start, see {log_path}")
+
+
+@odev.daemon.command()
+def stop():
+    """
+        Stop the background server.
+    """
+    if not (pid := _running()):
+        print("Daemon not running")
+        return
+    os.kill(pid, signal.SIGTERM)
+    print(f"Daemon stopped (pid {pid})")
+
+
+@odev.daemon.command()
+def status():
+    """
+        Display whether the background server is running.
+    """
+    if pid := _running():
+        print(f"Daemon running (pid {pid}) on {client.socket_path()}")
+    else:
+        print("Daemon not running")
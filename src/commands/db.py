@@ -1,17 +1,20 @@
 from typer import Argument
 
-from commands.common import WorkspaceNameArgument
+from commands.common import WorkspaceNameArgument, complete_db_names
 from odev import odev
 from pgsql import PgSql
 
 
 @odev.db.command()
-def clear(db_name: str | None = Argument(None, help="Database name"),
+def clear(db_name: str | None = Argument(None, help="Database name", autocompletion=complete_db_names),
              workspace_name: str | None = WorkspaceNameArgument()):
     """
          Clear database by dropping and recreating it.
     """
-    return PgSql.erase(db_name or odev.workspace.db_name)
+    db_name = db_name or odev.workspace.db_name
+    result = PgSql.erase(db_name)
+    odev.index.add_db_name(db_name)
+    return result
 
 
 @odev.db.command()
@@ -32,3 +35,4 @@ def restore(workspace_name: str | None = WorkspaceNameArgument()):
     dump_fullpath = odev.paths.workspace(workspace_name) / odev.workspace.db_dump_file
     print(f"Restoring {odev.workspace.db_name} <- {dump_fullpath}")
     PgSql.restore(odev.workspace.db_name, dump_fullpath)
+    odev.index.add_db_name(odev.workspace.db_name)
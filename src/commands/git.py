@@ -1,30 +1,55 @@
 # ruff: noqa: T201
 
+import json
+
+from rich import box
+from rich.console import Console
+from rich.markup import escape
+from rich.table import Table
+from typer import Option
+
+import paths
 import pl
 import tools
 
-from commands.common import WorkspaceNameArgument
+from commands.common import FailFastOption, JobsOption, JsonOption, TimeoutOption, WorkspaceNameArgument
 from odev import odev
-from git import Git
-from invoke import UnexpectedExit
+from git import Git, GitError, LsRemoteCache
 from templates import main_repos, template_repos
 
 
+def clean_command(_repo_name, repo, _version, quiet=False):
+    """ `pl.run` template cleaning the repository, but the build caches matching its `keep` patterns """
+    return Git.clean_command(repo.path, quiet=quiet, keep=repo.clean_keep)
+
+
 @odev.git.command()
-def clean():
+def clean(
+    workspace_name: str | None = WorkspaceNameArgument(),
+    jobs: str | None = JobsOption(),
+    timeout: str | None = TimeoutOption(),
+    fail_fast: bool = FailFastOption(),
+    json_output: bool = JsonOption(),
+):
     """
-        Git clean all repos
+        Git clean all repos, but the build caches matching their `keep` patterns
     """
     pl.run(
-        "git -C {path} clean -xdf",
+        clean_command,
         repos=odev.workspace.repos,
+        check=True,
     )
+    paths.prune_bytecode(*(repo.path for repo in odev.workspace.repos.values()))
 
 
 @odev.git.command()
 def reset(
     ask: bool = True,
     workspace_name: str | None = WorkspaceNameArgument(),
+    jobs: str | None = JobsOption(),
+    timeout: str | None = TimeoutOption(),
+    fail_fast: bool = FailFastOption(),
+    json_output: bool = JsonOption(),
 ):
     """
         Git reset on all workspaces, hard by default
@@ -33,6 +58,7 @@ def reset(
         pl.run(
             "git -C {path} reset --hard",
             repos=odev.workspace.repos,
+            check=True,
         )
         return False
     return True
@@ -41,10 +67,13 @@ def reset(
 @odev.git.command()
 def status(
     extended: bool = True,
+    untracked: bool = True,
+    json_output: bool = Option(False, '--json', help="Print the status of each repository as a JSON object"),
     workspace_name: str | None = WorkspaceNameArgument(default='last')
 ):
     """
-        Display status for all repos for current workspace.
+        Display status for all repos for current workspace, collected concurrently.
+        Without `extended`, only tells whether they're all clean.
     """
     def sorting_key(x):
         try:
@@ -52,21 +81,60 @@ def status(
         except ValueError:
             return 0
 
-    if extended:
+    if extended and not json_output:
         print(f"{odev.project.path} - {odev.workspace.name}")
-    for repo_name, repo in sorted(odev.workspace.repos.items(), key=sorting_key):
+    repo_paths = {}
+    for repo_name, _repo in sorted(odev.workspace.repos.items(), key=sorting_key):
         path = odev.paths.repo(repo_name)
         if not path.is_dir():
-            print(f"Repository {repo_name} hasn't been cloned yet.")
+            pl.echo(f"Repository {repo_name} hasn't been cloned yet.")
             continue
-        ret = Git.status(path, extended=extended, name=repo_name)
-        if not extended and ret.stdout:
-            return False
+        repo_paths[repo_name] = path
+    if not extended:
+        dirty = Git.find_dirty(repo_paths, untracked=untracked)
+        for repo_name, changes in dirty.items():
+            more = f" and {len(changes) - 5} more" if len(changes) > 5 else ""
+            pl.echo(f"{repo_name} has changes: {', '.join(changes[:5])}{more}")
+        return not dirty
+    infos = dict(zip(repo_paths, Git.gather(Git.status_info_async(path) for path in repo_paths.values())))
+    if json_output:
+        for repo_name, info in infos.items():
+            print(json.dumps({'repo': repo_name, **info}))
+    else:
+        print_status_table(infos)
     return True
 
 
+def print_status_table(infos):
+    table = Table(box=box.SIMPLE)
+    for column in ("repo", "branch", "upstream", "staged", "unstaged", "untracked", "last commit"):
+        table.add_column(column, justify="right" if column in ("staged", "unstaged", "untracked") else "left")
+    for repo_name, info in infos.items():
+        divergence = " ".join(x for x in (
+            f"↑{info['ahead']}" if info['ahead'] else "",
+            f"↓{info['behind']}" if info['behind'] else "",
+        ) if x)
+        table.add_row(
+            repo_name,
+            escape(info['branch']) + (f" [red]({info['conflicts']} conflicts)[/red]" if info['conflicts'] else ""),
+            f"{info['upstream'] or '-'} {divergence}".strip(),
+            *(f"[{style}]{info[key]}[/{style}]" if info[key] else "." for key, style in (
+                ('staged', 'green'), ('unstaged', 'red'), ('untracked', 'yellow'),
+            )),
+            f"[dim]{info['commit']}[/dim] {escape(info['subject'] or '')}" if info['commit'] else "-",
+        )
+    Console().print(table)
+
+
 @odev.git.command()
-def diff(origin: bool = False, workspace_name: str | None = WorkspaceNameArgument()):
+def diff(
+    origin: bool = False,
+    workspace_name: str | None = WorkspaceNameArgument(),
+    jobs: str | None = JobsOption(),
+    timeout: str | None = TimeoutOption(),
+    fail_fast: bool = FailFastOption(),
+    json_output: bool = JsonOption(),
+):
     """
         Git-diffs all repositories.
     """
@@ -75,9 +143,18 @@ def diff(origin: bool = False, workspace_name: str | None = WorkspaceNameArgumen
         "git -C {path} diff",
         "git -C {path} diff --cached",
         repos=odev.workspace.repos,
+        check=True,
     )
 
 
+@odev.git.command()
+def forget_remotes():
+    """
+        Clear the cached `git ls-remote` results, the next lookups query the remotes again.
+    """
+    LsRemoteCache.load().clear()
+
+
 @odev.git.command()
 def fetch(origin: bool = False, workspace_name: str | None = WorkspaceNameArgument()):
     """
@@ -89,6 +166,7 @@ def fetch(origin: bool = False, workspace_name: str | None = WorkspaceNameArgume
         path = odev.paths.repo(repo_name)
         if origin:
             Git.fetch(path, repo_name, "origin", "")
+            tools.index_branches([repo_name])
 
 
 @odev.git.command()
@@ -100,6 +178,7 @@ def pull(workspace_name: str | None = WorkspaceNameArgument()):
         print(f"Pulling {repo_name}...")
         repo = odev.workspace.repos[repo_name]
         Git.pull(odev.paths.repo(repo_name), repo.remote, repo.branch)
+        tools.index_branches([repo_name])
 
 
 def _checkout_repo(repo_name, repo, force_create=False):
@@ -108,7 +187,8 @@ def _checkout_repo(repo_name, repo, force_create=False):
     try:
         print(f"Fetching {target}...")
         Git.fetch(path, repo_name, repo.remote, repo.branch)
-    except UnexpectedExit:
+        tools.index_branches([repo_name])
+    except GitError:
         if not force_create:
             raise
         print(f"Creating {target}...")
@@ -116,7 +196,8 @@ def _checkout_repo(repo_name, repo, force_create=False):
     print(f"Checking out {target}...")
     Git.checkout(path, repo.branch)
     print(f"Cleaning {path}...")
-    Git.clean(path, quiet=True)
+    Git.clean(path, quiet=True, keep=repo.clean_keep)
+    paths.prune_bytecode(path)
 
 
 @odev.git.command()
@@ -15,13 +15,14 @@ import pl
 import tools
 from consts import APPNAME
 from commands import git
-from commands.common import WorkspaceNameArgument, set_target
+from commands.common import FailFastOption, JobsOption, JsonOption, TimeoutOption, WorkspaceNameArgument, complete_branches, helps, set_target
 from commands.workspace import _switch
-from git import Git
+from git import FetchPlan, Git
 from odev import odev
 from odoo import Odoo
 from runbot import Runbot
 from templates import addons_path, origins, main_repos, template_repos
+from warmup import summary as warmup_summary
 
 
 @odev.odoo.command(name="start")
@@ -45,6 +46,7 @@ def start(
         pty=True,
         demo=demo,
         stop=stop,
+        warmup=warmup_summary(odev.paths.warmup(odev.workspace.name)),
     )
 
 
@@ -88,7 +90,7 @@ def deps(module, workspace_name: str | None = WorkspaceNameArgument()):
         for repo_name, repo in odev.workspace.repos.items():
             if repo_addons_path := addons_path.get(repo_name, []):
                 for folder in repo_addons_path:
-                    folders.append(str(odev.paths.relative(repo_name) / folder))
+                    folders.append(str(odev.paths.repo(repo_name) / folder))
 
         fullpaths = [Path(x) / current / y
                      for x, y in itertools.product(folders, manifest_names)]
@@ -122,7 +124,7 @@ def deps(module, workspace_name: str | None = WorkspaceNameArgument()):
 
 @odev.odoo.command()
 def get_branches(
-    bundle_name: str = Argument('None', help='Bundle name'),
+    bundle_name: str = Argument('None', help='Bundle name', autocompletion=complete_branches),
     workspace_name: str | None = WorkspaceNameArgument(),
 ):
     """
@@ -130,20 +132,28 @@ def get_branches(
     """
     bundle_name = tools.cleanup_colon(bundle_name or workspace_name)
     branches = Runbot.get_branches(bundle_name)
-    print(branches)
+    pl.echo(branches)
     return branches
 
 
 @odev.odoo.command()
 def bundle(
     ctx: Context,
-    bundle_name: str = Argument('', help="Bundle name"),
+    bundle_name: str = Argument('', help="Bundle name", autocompletion=complete_branches),
     db_name: str = Argument('odoo', help="Database name"),
     workspace_name: str | None = WorkspaceNameArgument(),
+    jobs: str | None = JobsOption(),
+    timeout: str | None = TimeoutOption(),
+    fail_fast: bool = FailFastOption(),
+    json_output: bool = JsonOption(),
+    warmup: str = Option('all', help=helps['warmup']),
+    depth: int | None = Option(None, help="Only fetch this many commits of the branches, deepened as needed"),
+    shallow_since: str | None = Option(None, help="Only fetch the commits of the branches since this date, deepened as needed"),
 ):
     """
         Creates a workspace from a Bundle on Runbot.
         If `load` is specified, it also loads generated workspace.
+        With `depth` or `shallow_since`, the history is only fetched as far as the merge bases need.
     """
     if not odev.project:
         sys.exit(f"{APPNAME}: current folder holds no projects.")
@@ -160,7 +170,7 @@ def bundle(
     base_branch = version['name']
     have_dev_origin = [k for k, v in origins.items() if 'dev' in v]
     if arbitrary_repo := next(iter(list(set(have_dev_origin) & repo_names)), None):
-        base_branch = tools.find_base(arbitrary_repo, branch=bundle_name)
+        base_branch = tools.find_base(arbitrary_repo, bundle_name, depth, shallow_since)
 
     repos = {}
     for repo_name in set(main_repos) | set(repo_names):
@@ -178,7 +188,7 @@ def bundle(
             else:
                 repo.branch = 'master'
             repo.remote = 'origin'
-        repo.path = str(odev.paths.repo(repo_name))
+        repo.path = str(repo_path)
         repos[repo_name] = repo
 
     if not (workspace := tools.workspace_prepare(
@@ -196,15 +206,13 @@ def bundle(
     else:
         modules = workspace.modules
 
-    pl.run(
-        "git -C {path} fetch --progress origin " + base_branch,
-        "git -C {path} fetch --progress {remote} {branch}",
-        repos=repos,
-    )
-    pl.run(
-        "git -C {path} checkout -B {branch} --track {remote}/{branch}",
-        repos=repos,
-    )
+    plan = FetchPlan(depth, shallow_since)
+    for repo_name, repo in repos.items():
+        plan.add(repo_name, 'origin', base_branch)
+        plan.add(repo_name, repo.remote, repo.branch)
+    # the branches are checked out, and the repositories cleaned, when switching to the workspace
+    pl.run(plan.stages('--progress'), repos=repos, check=True)
+    tools.index_branches(repos)
 
     for repo_name, repo in repos.items():
         if search_modules and repo_name in repo_names:
@@ -218,7 +226,7 @@ def bundle(
 
     tools.workspace_install(workspace)
     set_target(workspace.name)
-    _switch(workspace.name, ask_reset=False)
+    _switch(workspace.name, ask_reset=False, warmup=warmup)
 
 
 @odev.odoo.command()
@@ -249,7 +257,7 @@ def l10n_tests(
         db.clear(odev.workspace.db_name)
     odev.paths.relative(odev.workspace.rc_file)
 
-    Odoo.l10n_tests(odev.paths.relative('odoo'),
+    Odoo.l10n_tests(odev.paths.repo('odoo'),
                     odev.workspace.db_name,
                     odev.paths.relative(odev.workspace.venv_path),
                     tags)
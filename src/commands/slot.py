@@ -5,7 +5,7 @@ from typer import Context, Argument
 
 import pl
 from odev import odev
-from commands.common import WorkspaceNameArgument
+from commands.common import FailFastOption, JobsOption, JsonOption, TimeoutOption, WorkspaceNameArgument
 
 
 def get_name(name="QuickSave"):
@@ -17,10 +17,15 @@ def save(
     ctx: Context,
     workspace_name: str | None = WorkspaceNameArgument(),
     name: str | None = Argument(default="QuickSave"),
+    jobs: str | None = JobsOption(),
+    timeout: str | None = TimeoutOption(),
+    fail_fast: bool = FailFastOption(),
+    json_output: bool = JsonOption(),
 ):
     pl.run(
         f"git -C {{path}} stash push -u -m '{get_name(name)}'",
         repos=odev.workspace.repos,
+        check=True,
     )
 
 
@@ -29,8 +34,11 @@ def load(
     ctx: Context,
     name: str | None = Argument(default='QuickSave'),
     workspace_name: str | None = WorkspaceNameArgument(),
+    jobs: str | None = JobsOption(),
+    timeout: str | None = TimeoutOption(),
+    fail_fast: bool = FailFastOption(),
 ):
-    output = pl.run(
+    results = pl.run(
         f"git -C {{path}} stash list --grep='{name}'",
         repos=odev.workspace.repos,
         header=False,
@@ -41,7 +49,8 @@ def load(
             k: int(v) if v.isdigit() else v
             for k, v in groups.items()
         }
-        for line in output.splitlines()
+        for command_result in results
+        for line in (command_result.stdout or '').splitlines()
         if (name in line)
         and (match := re.match(r'stash@{(?P<stash_no>\d+)}: On (?P<branch>.*): (?P<title>.*)$', line))
         and (groups := match.groupdict())
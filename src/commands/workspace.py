@@ -1,18 +1,25 @@
 # ruff: noqa: T201
 
+import asyncio
 import shutil
 import fileinput
+from datetime import datetime
+from functools import partial
+from pathlib import Path
 
-from typer import Argument, Context
+from typer import Argument, Context, Option
 
+import paths
 import pl
 import sys
 import tools
-from commands.common import WorkspaceNameArgument, helps, set_target
-from commands.git import status, reset
+from commands.common import FailFastOption, JobsOption, JsonOption, TimeoutOption, WorkspaceNameArgument, helps, set_target
+from commands.git import clean_command, status, reset
+from git import FetchPlan, Git
 from odev import odev
 from templates import template_repos
 from workspace import Workspace
+from worktrees import Worktrees
 
 
 @odev.workspace.command()
@@ -25,47 +32,121 @@ def last_used():
     print(odev.project.last_used)
 
 
-def _switch(workspace_name, ask_reset=True):
+def _plan_switch(repos, refresh=False):
+    """
+        Fetch plan of the repositories, and {name: action} of each of them.
+        Repositories already on their branch, at its remote tip as `ls-remote` tells now, are left alone:
+        cleaning them would only make Odoo recompile everything. With `refresh`, the other ones
+        are fetched whatever the cache says.
+    """
+    plan = FetchPlan(refresh=refresh)
+    tips = Git.gather(
+        Git.remote_tip_async(repo.path, repo.remote, repo.branch, refresh=True)
+        if Path(repo.path).is_dir() else asyncio.sleep(0)
+        for repo in repos.values()
+    )
+    actions = {}
+    for (repo_name, repo), tip in zip(repos.items(), tips):
+        plan.add(repo_name, repo.remote, repo.branch)
+        if not Path(repo.path).is_dir():
+            actions[repo_name] = "fetch, clean and switch"
+        elif tip and Git.get_current_branch(repo.path) == repo.branch and (head := Git.rev_parse(repo.path, 'HEAD')) == tip:
+            actions[repo_name] = None
+            pl.echo(f"{repo_name}: up to date, {repo.branch} at {head[:10]}")
+            continue
+        elif plan.refspecs(repo_name, repo.path):
+            actions[repo_name] = f"fetch {repo.remote}/{repo.branch}, clean and switch"
+        else:
+            actions[repo_name] = f"clean and switch to {repo.remote}/{repo.branch}"
+        pl.echo(f"{repo_name}: {actions[repo_name]}")
+    return plan, actions
+
+
+def _switch(workspace_name, ask_reset=True, dry_run=False, update=False, warmup='all'):
+    """
+        Check the workspace's branches out. With worktrees, loading a workspace only creates
+        its missing worktrees, the others are updated only when `update` is set.
+        Then its bytecode is precompiled in the background, `warmup` being all, modules or none.
+    """
     workspace_file = odev.paths.workspace_file(workspace_name)
     workspace = Workspace.load_json(workspace_file)
-    if not status(extended=False) and ask_reset and reset():
+    worktrees = bool(odev.project.worktrees)
+    if not dry_run and (update or not worktrees) and not status(extended=False) and ask_reset and reset():
         return
 
     last_used = odev.project.last_used
-    print(f"{last_used} -> {workspace_name} (updated)...")
+    pl.echo(f"{last_used} -> {workspace_name}{' (dry run)' if dry_run else ' (updated)' if update else ''}...")
 
-    # Cleaning and fetching
-    pl.run(
-        "git -C {path} clean -xdfq",
-        "git -C {path} fetch {remote} {branch}",
-        repos=odev.workspace.repos,
-    )
-    # Switching
-    pl.run(
-        "git -C {path} switch -C {branch} --track {remote}/{branch}",
-        repos=odev.workspace.repos,
-    )
-    tools.set_last_used(workspace_name)
+    if worktrees and not update:
+        for repo_name, repo in odev.workspace.repos.items():
+            pl.echo(f"{repo_name}: {'worktree at' if Path(repo.path).is_dir() else 'create the worktree'} {repo.path}")
+        if dry_run:
+            return
+        tools.materialize_worktrees(odev.workspace)
+    else:
+        if worktrees and not dry_run:
+            # a workspace updated before it was ever loaded has no worktrees yet
+            tools.materialize_worktrees(odev.workspace)
+        # updating is fetching, the cached remote tips aren't trusted
+        plan, actions = _plan_switch(odev.workspace.repos, refresh=update)
+        if dry_run:
+            return
+        switch = f"git -C {{path}} switch{' --ignore-other-worktrees' if worktrees else ''} -C {{branch}} --track {{remote}}/{{branch}}"
+        repos = {repo_name: repo for repo_name, repo in odev.workspace.repos.items() if actions[repo_name]}
+        if repos:
+            # Cleaning and fetching, then switching, each repo on its own
+            pl.run(
+                [(partial(clean_command, quiet=True), *plan.stages()), switch],
+                repos=repos,
+                check=True,
+            )
+            paths.prune_bytecode(*(repo.path for repo in repos.values()))
+    tools.index_branches(odev.workspace.repos)
+    if worktrees:
+        # an updated workspace isn't the one in use, whose worktrees stay
+        tools.evict_worktrees(workspace_name, in_use=odev.project.last_used if update else None)
+    if not (worktrees and update):
+        tools.set_last_used(workspace_name)
+    workspace.set_path(odev.paths.root(workspace_name))
     odev.workspace = workspace
+    if warmup != 'none' and tools.warmup_workspace(workspace, modules_only=warmup == 'modules'):
+        pl.echo(f"Precompiling {workspace_name} in the background...")
 
 
 @odev.workspace.command()
-def load(workspace_name: str | None = WorkspaceNameArgument(default=None)):
+def load(
+    workspace_name: str | None = WorkspaceNameArgument(default=None),
+    jobs: str | None = JobsOption(),
+    timeout: str | None = TimeoutOption(),
+    fail_fast: bool = FailFastOption(),
+    json_output: bool = JsonOption(),
+    dry_run: bool = Option(False, '--dry-run', help="Only print what would be done in each repository"),
+    warmup: str = Option('all', help=helps['warmup']),
+):
     """
         Load given workspace into the session.
+        Repositories already on their branch at the remote tip are left untouched.
     """
-    _switch(workspace_name)
+    _switch(workspace_name, dry_run=dry_run, warmup=warmup)
 
 
 @odev.workspace.command()
-def update(ctx: Context, workspace_name: str | None = WorkspaceNameArgument()):
+def update(
+    ctx: Context,
+    workspace_name: str | None = WorkspaceNameArgument(),
+    jobs: str | None = JobsOption(),
+    timeout: str | None = TimeoutOption(),
+    fail_fast: bool = FailFastOption(),
+    json_output: bool = JsonOption(),
+):
     """
         Updates given workspace and reloads the current one.
         With asynchronous methods.
     """
     last_used = odev.project.last_used
-    _switch(workspace_name)
-    if last_used:
+    _switch(workspace_name, update=True, warmup='all' if odev.project.worktrees else 'none')
+    # with worktrees, the current workspace's ones weren't touched
+    if last_used and not odev.project.worktrees:
         last_workspace_file = odev.paths.workspace_file(last_used)
         last_workspace = Workspace.load_json(last_workspace_file)
         last_workspace.set_path(odev.paths.project)
@@ -73,10 +154,30 @@ def update(ctx: Context, workspace_name: str | None = WorkspaceNameArgument()):
         pl.run(
             "git -C {path} checkout {branch}",
             repos=last_repos,
+            check=True,
         )
         tools.set_last_used(last_used)
 
 
+@odev.workspace.command()
+def worktrees(
+    keep: int | None = Option(None, '--keep', help="Workspaces kept in their own worktrees, 0 to share the project's checkouts"),
+):
+    """
+        List the workspaces checked out in their own worktrees, most recently used first, with their disk usage.
+    """
+    if keep is not None:
+        odev.project.worktrees = keep
+        odev.projects.save()
+        tools.evict_worktrees(odev.project.last_used if keep else None)
+    print(f"Worktrees kept: {odev.project.worktrees or 'none, the project checkouts are shared'}")
+    total = 0
+    for workspace_name, used in Worktrees.load(odev.paths.worktrees).by_use():
+        total += (usage := paths.disk_usage(odev.paths.worktree(workspace_name)))
+        print(f"{workspace_name:<40} {tools.date_to_string(datetime.fromtimestamp(used)):<20} {usage / 2**20:>10.1f} MiB")
+    print(f"{'total':<61} {total / 2**20:>10.1f} MiB")
+
+
 @odev.workspace.command()
 def dupe(
     workspace_name: str | None = WorkspaceNameArgument(default=None),
@@ -112,7 +213,7 @@ def dupe(
     set_target(dest_workspace_name)
     tools.workspace_install(dest_workspace_name)
     if _load:
-        load(dest_workspace_name)
+        _switch(dest_workspace_name)
 
 
 @odev.workspace.command()
@@ -0,0 +1,268 @@
+# ruff: noqa: T201
+
+import heapq
+import inspect
+import os
+import re
+import shlex
+from bisect import bisect_left
+from pathlib import Path
+
+import consts
+from json_mixin import JsonMixin
+from paths import digest, ensure, parent_digests, signature
+from project import Projects
+
+COMPLETE_VAR = '_OCLI_COMPLETE'
+SHELLS = ('bash', 'zsh', 'fish')
+
+
+class CompletionIndex(JsonMixin):
+    """
+        Small per-project index that shell completion reads instead of
+        scanning folders or spawning git/psql on every TAB press.
+        It's kept up to date by the commands that change its content.
+    """
+
+    def __init__(
+        self,
+        path=None,
+        workspaces=None,
+        workspaces_signature=None,
+        db_names=None,
+        commands=None,
+    ):
+        self.path = path
+        self.workspaces = workspaces or []
+        self.workspaces_signature = workspaces_signature or []
+        self.db_names = db_names or []
+        self.commands = commands or {}
+
+    @classmethod
+    def load(cls, path):
+        index = cls.load_json(path) or CompletionIndex()
+        index.path = path
+        return index
+
+    def to_json_excluded(self):
+        return ['path'] + super().to_json_excluded()
+
+    def save(self):
+        ensure(Path(self.path).parent)
+        return self.save_json(self.path)
+
+    def set_workspaces(self, workspaces, signature):
+        self.workspaces = workspaces
+        self.workspaces_signature = list(signature or [])
+        self.save()
+
+    def set_db_names(self, db_names):
+        self.db_names = sorted({x for x in db_names if x})
+        self.save()
+
+    def add_db_name(self, db_name):
+        if db_name and db_name not in self.db_names:
+            self.set_db_names([*self.db_names, db_name])
+
+    def set_commands(self, group_name, group, signature):
+        """ Keep what the parameters of a command group complete with, until its module changes """
+        signature = list(signature or [])
+        if self.commands.get(group_name, {}).get('signature') != signature:
+            self.commands[group_name] = {'signature': signature, 'commands': command_schema(group)}
+            self.save()
+
+    def names(self, kind):
+        """ Completion candidates: workspaces, db_names or branches, without their remote """
+        if kind == 'branches':
+            # read as is, completing doesn't change them
+            data = BranchIndex.read_json(BranchIndex.path_of(self.path)) or {}
+            return sorted({
+                branch.split('/', 1)[-1]
+                for repo_branches in data.get('branches', {}).values()
+                for branch in repo_branches
+            })
+        return getattr(self, kind)
+
+
+class BranchIndex(JsonMixin):
+    """
+        Remote branches of each repository, with the signature of the refs they were read from.
+        There can be tens of thousands of them, so they are kept next to the `CompletionIndex`
+        and only read when branches are completed, prompted for or indexed.
+    """
+
+    def __init__(self, path=None, branches=None, signatures=None):
+        self.path = path
+        self.branches = branches or {}
+        self.signatures = signatures or {}
+
+    @staticmethod
+    def path_of(index_path):
+        return Path(index_path).with_suffix('.branches.json')
+
+    @classmethod
+    def load(cls, path):
+        index = cls.load_json(path) or BranchIndex()
+        index.path = path
+        return index
+
+    def to_json_excluded(self):
+        return ['path'] + super().to_json_excluded()
+
+    def save(self):
+        ensure(Path(self.path).parent)
+        return self.save_json(self.path)
+
+    def set_branches(self, repo_name, branches, signature=None):
+        self.branches[repo_name] = sorted(branches)
+        self.signatures[repo_name] = signature
+        self.save()
+
+
+def command_schema(group):
+    """
+        {command: {arguments: [kind], options: {option: kind}, flags: [flag]}} of a click group
+        made by typer, `kind` being the `complete_<kind>` function of the parameter, '' if none.
+    """
+    schema = {}
+    for name, command in group.commands.items():
+        if not (function := getattr(command.callback, '__wrapped__', None)):
+            continue
+        defaults = {key: value.default for key, value in inspect.signature(function).parameters.items()}
+        arguments, options, flags = [], {}, []
+        for param in command.params:
+            completer = getattr(defaults.get(param.name), 'autocompletion', None)
+            kind = completer.__name__.removeprefix('complete_') if completer else ''
+            if param.param_type_name == 'argument':
+                arguments.append(kind)
+            elif param.is_flag or param.count:
+                flags.extend([*param.opts, *param.secondary_opts])
+            else:
+                options.update(dict.fromkeys(param.opts, kind))
+        schema[name] = {'arguments': arguments, 'options': options, 'flags': flags}
+    return schema
+
+
+def completed_kind(command, args):
+    """ Kind of the parameter whose value is being completed after the `args` of a command """
+    position, option = 0, None
+    for arg in args:
+        if option:
+            option = None
+        elif arg in command['flags'] or (arg.startswith('--') and '=' in arg):
+            continue
+        elif arg.startswith('-'):
+            if arg not in command['options']:
+                return None
+            option = arg
+        else:
+            position += 1
+    if option:
+        return command['options'][option]
+    return command['arguments'][position] if position < len(command['arguments']) else None
+
+
+def zsh_quoted(name):
+    for char, escaped in (('"', '""'), ("'", "''"), ('$', '\\$'), ('`', '\\`'), (':', r'\\:')):
+        name = name.replace(char, escaped)
+    return f'"{name}"'
+
+
+def answer(environ=None):
+    """
+        Answer a TAB press on the value of a parameter of `ocli <group> <command>` from the
+        project's index, without importing typer nor the command modules.
+        Returns the exit code, or None when the whole command line handling has to answer it:
+        the group or the workspaces changed since they were indexed, or it's not about a value.
+    """
+    environ = os.environ if environ is None else environ
+    instruction, _, shell = environ.get(COMPLETE_VAR, '').partition('_')
+    if instruction != 'complete' or shell not in SHELLS:
+        return None
+    try:
+        if shell == 'bash':
+            words, cword = shlex.split(environ['COMP_WORDS']), int(environ['COMP_CWORD'])
+            args, incomplete = words[1:cword], ''.join(words[cword:cword + 1])
+        else:
+            line = environ.get('_TYPER_COMPLETE_ARGS', '')
+            args = shlex.split(line)[1:]
+            incomplete = args.pop() if args and not line.endswith(' ') else ''
+    except (KeyError, ValueError):
+        return None
+    if len(args) < 2 or incomplete.startswith('-'):
+        return None
+
+    config = Path.home() / '.config' / consts.APPNAME
+    projects = Projects.load(config / 'projects.json')
+    if not (project := next((projects[x] for x in parent_digests(Path.cwd()) if x in projects), None)):
+        return None
+    index = CompletionIndex.load(config / 'index' / f"{digest(Path(project.path))}.json")
+    group = index.commands.get(args[0], {})
+    module = Path(__file__).parent / 'commands' / f"{args[0]}.py"
+    if not group or group['signature'] != list(signature(module) or []):
+        return None
+    if not (command := group['commands'].get(args[1])) or not (kind := completed_kind(command, args[2:])):
+        return None
+    workspaces = config / 'workspaces' / digest(Path(project.path))
+    if kind == 'workspaces' and index.workspaces_signature != list(signature(workspaces) or []):
+        return None
+
+    names = [x for x in index.names(kind) if x.startswith(incomplete)]
+    if shell == 'zsh':
+        quoted = "\n".join(map(zsh_quoted, names))
+        print(f"_arguments '*: :(({quoted}))'" if names else "_files")
+    elif shell == 'fish' and environ.get('_TYPER_COMPLETE_FISH_ACTION') == 'is-args':
+        return 0 if names else 1
+    else:
+        print("\n".join(names))
+    return 0
+
+
+class NameIndex:
+    """
+        Ranked search of names by the prefixes of their tokens, i.e. '17.0 stock' or 'saas abc'
+        finds 'saas-17.0-stock-move-abc'. Names are ranked shortest first, then those starting
+        with the whole query come first.
+        Every token lists the ranks of its names in order, the tokens matching a term are
+        found by bisection and their lists merged lazily, so that only the best ranked
+        candidates are ever looked at.
+    """
+    SEPARATORS = re.compile(r"[\s\-_/]+")
+
+    def __init__(self, names):
+        self.names = sorted(set(names), key=lambda x: (len(x), x))
+        self.lowered = [x.lower() for x in self.names]
+        # ' token token ...', a term prefixes a token where ' term' is found
+        self.joined = []
+        postings = {}
+        for rank, name in enumerate(self.lowered):
+            tokens = self.split(name)
+            self.joined.append(" " + " ".join(tokens))
+            for token in tokens:
+                postings.setdefault(token, []).append(rank)
+        self.keys = sorted(postings)
+        self.postings = [postings[key] for key in self.keys]
+
+    @classmethod
+    def split(cls, text):
+        return [x for x in cls.SEPARATORS.split(text) if x]
+
+    def candidates(self, term):
+        """ Postings of the tokens starting with `term` """
+        return self.postings[bisect_left(self.keys, term):bisect_left(self.keys, term + "\uffff")]
+
+    def search(self, query, limit=20):
+        query = query.lower().strip()
+        if not (terms := self.split(query)):
+            return self.names[:limit]
+        # the rarest term drives the search, the other ones filter its names
+        postings = min((self.candidates(term) for term in terms), key=lambda x: sum(map(len, x)))
+        needles = [" " + term for term in terms]
+        found = []
+        for rank in heapq.merge(*postings):
+            if (not found or rank != found[-1]) and all(x in self.joined[rank] for x in needles):
+                found.append(rank)
+                if len(found) == limit:
+                    break
+        found.sort(key=lambda rank: not self.lowered[rank].startswith(query))
+        return [self.names[rank] for rank in found]
@@ -1,2 +1,4 @@
 APPNAME = "odev"
 QMARK = ">"
+# Untracked files `git clean` leaves by default, build caches that are still valid after a switch
+CLEAN_KEEP = ['__pycache__', 'node_modules', '.venv']
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# ruff: noqa: T201
+"""
+    Background server for `ocli`.
+
+    Keeps the command modules imported and the `Odev` state (projects,
+    workspaces, merge cache) in memory, reloading files only when they change
+    on disk. Every request from `client.py` is served in a forked child that
+    inherits the warm state and takes over the client's stdin/stdout/stderr.
+"""
+
+import os
+import signal
+import socket
+import sys
+import traceback
+
+import typer.core
+typer.core.rich = None
+
+import client  # noqa: E402
+import typer.main  # noqa: E402
+from odev import odev  # noqa: E402
+
+
+def preload():
+    command = typer.main.get_command(odev)
+    command.list_commands(None)
+    return command
+
+
+def handle(conn, command, request, fds):
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    sys.stdin = open(0, encoding='utf-8', closefd=False)
+    sys.stdout = open(1, 'w', encoding='utf-8', buffering=1, closefd=False)
+    sys.stderr = open(2, 'w', encoding='utf-8', buffering=1, closefd=False)
+    os.chdir(request['cwd'])
+    os.environ.clear()
+    os.environ.update(request['env'])
+    client.send(conn, pid=os.getpid())
+
+    exit_code = 0
+    try:
+        command.main(args=request['argv'], prog_name=request['prog_name'])
+    except SystemExit as e:
+        if isinstance(e.code, str):
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+        else:
+            exit_code = e.code or 0
+    except KeyboardInterrupt:
+        exit_code = 130
+    except Exception:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    client.send(conn, exit=exit_code)
+
+
+def serve(path):
+    command = preload()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    path.unlink(missing_ok=True)
+    server.bind(str(path))
+    os.chmod(path, 0o600)
+    server.listen()
+    client.pid_path().write_text(str(os.getpid()), encoding='utf-8')
+    print(f"Listening on {path} (pid {os.getpid()})", file=sys.stderr)
+
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *_args: sys.exit(0))
+    try:
+        while True:
+            conn, _address = server.accept()
+            fds = []
+            with conn, conn.makefile('rb') as stream:
+                try:
+                    _msg, fds, _flags, _address = socket.recv_fds(conn, 1, 3)
+                    if request := client.receive(stream):
+                        odev.setup(request['cwd'])
+                except Exception:
+                    # the client falls back to running the command by itself
+                    traceback.print_exc()
+                    request = None
+                if request and not os.fork():
+                    server.close()
+                    try:
+                        handle(conn, command, request, fds)
+                    finally:
+                        os._exit(0)
+            for fd in fds:
+                os.close(fd)
+    finally:
+        server.close()
+        path.unlink(missing_ok=True)
+        client.pid_path().unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    serve(client.socket_path())
@@ -1,6 +1,5 @@
 # ruff: noqa: T201
 
-import invoke
 import shutil
 
 
@@ -10,6 +9,7 @@ class External:
     def run(cls, command, pty=True, hide=None, echo=True, in_stream=None):
         if echo:
             print("$ " + command)
+        import invoke
         return invoke.run(command, pty=pty, hide=hide, in_stream=in_stream)
 
     @classmethod
@@ -1,52 +1,426 @@
 # ruff: noqa: T201
 
 import asyncio
-import invoke
+import atexit
+import os
+import re
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+import time
 from collections import namedtuple
+from contextlib import suppress
+from pathlib import Path
+
+import consts
+import paths
 from external import External
-import re
+from json_mixin import JsonMixin
 
 AsyncProc = namedtuple('AsyncProc', ['returncode', 'stdout', 'stderr'])  # noqa: PYI024
 
+# Max length of a line read from a streamed output
+LINE_LIMIT = 2 ** 20
+
+
+class GitError(Exception):
+    """ A git command exited with a non-zero status """
+
+    def __init__(self, args, proc):
+        self.args_list = args
+        self.proc = proc
+        stderr = (proc.stderr or '').strip()
+        super().__init__(f"git {shlex.join(args)} exited with status {proc.returncode}" + (f": {stderr}" if stderr else ''))
+
+
+def kill(proc, group=False):
+    """ Kill the process, or its whole group so that helpers like ssh don't keep its pipes open """
+    if proc.returncode is None:
+        with suppress(ProcessLookupError):
+            if group:
+                os.killpg(proc.pid, signal.SIGKILL)
+            else:
+                proc.kill()
+
+
+def decode(data):
+    return data.decode(errors='replace') if data is not None else None
+
+
+def parse_porcelain_path(line):
+    """ Path of a `git status --porcelain=v2` entry, the fields before it depend on its kind """
+    kind = line[:1]
+    if kind == '1':
+        return line.split(' ', 8)[-1]
+    if kind == '2':
+        return line.split(' ', 9)[-1].split('\t')[0]
+    if kind == 'u':
+        return line.split(' ', 10)[-1]
+    return line[2:]
+
+
+class RepoWorker:
+    """
+        A long-lived `git cat-file --batch-check` per repository, that resolves
+        revisions over a pipe instead of starting git, loading its config and
+        refs, for every query. Workers are kept for the whole process, and are
+        started again in forked processes, i.e. the daemon's request handlers.
+    """
+    workers = {}
+
+    def __init__(self, path):
+        self.path = path
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.proc = subprocess.Popen(
+            ['git', 'cat-file', '--batch-check'],
+            cwd=path,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._git_dir = None
+
+    @classmethod
+    def get(cls, path):
+        key = str(Path(path).absolute())
+        worker = cls.workers.get(key)
+        if not worker or worker.pid != os.getpid() or worker.proc.poll() is not None:
+            worker = cls.workers[key] = cls(key)
+        return worker
+
+    @classmethod
+    def close_all(cls):
+        for worker in cls.workers.values():
+            if worker.pid == os.getpid():
+                worker.close()
+        cls.workers.clear()
+
+    def close(self):
+        with suppress(OSError):
+            self.proc.stdin.close()
+        with suppress(subprocess.TimeoutExpired):
+            self.proc.wait(timeout=1)
+        kill(self.proc)
+        self.proc.stdout.close()
+
+    def resolve(self, rev):
+        """ Object id of `rev`, None if it doesn't exist """
+        if not rev or '\n' in rev:
+            return None
+        with self.lock:
+            self.proc.stdin.write(rev.encode() + b'\n')
+            self.proc.stdin.flush()
+            line = self.proc.stdout.readline().decode().rstrip('\n')
+        if not line:
+            raise GitError(['cat-file', '--batch-check'], AsyncProc(self.proc.poll(), None, None))
+        oid, _sep, kind = line.partition(' ')
+        return None if kind in ('missing', 'ambiguous') else oid
+
+    @property
+    def git_dir(self):
+        if not self._git_dir:
+            output = subprocess.run(
+                ['git', 'rev-parse', '--absolute-git-dir'],
+                cwd=self.path, capture_output=True, text=True, check=True,
+            ).stdout.strip()
+            self._git_dir = Path(output)
+        return self._git_dir
+
+    def current_branch(self):
+        """ What `git branch --show-current` prints, read from HEAD """
+        head = (self.git_dir / 'HEAD').read_text(encoding='utf-8').strip()
+        return head.removeprefix('ref: refs/heads/') if head.startswith('ref: refs/heads/') else ''
+
+
+atexit.register(RepoWorker.close_all)
+
+
+def strip_remote(refs, remote=None):
+    """ Branch names of `remote` from 'remote/branch' refs, all of them if no remote is given """
+    if not remote:
+        return refs
+    return [x[len(remote) + 1:] for x in refs if x.startswith(f'{remote}/')]
+
+
+class RefIndex:
+    """
+        Remote branches read straight from `packed-refs` and the loose refs, without
+        starting git. Parsed lists are kept by repository until the signature of the
+        ref files changes, i.e. after a fetch.
+    """
+    cache = {}
+
+    @classmethod
+    def git_dir(cls, path):
+        """ Where the refs are, worktrees share those of their main repository """
+        git_dir = Path(path) / '.git'
+        if git_dir.is_file():
+            git_dir = (Path(path) / git_dir.read_text(encoding='utf-8').strip().removeprefix('gitdir: ')).resolve()
+            if (common_dir := git_dir / 'commondir').exists():
+                git_dir = (git_dir / common_dir.read_text(encoding='utf-8').strip()).resolve()
+        return git_dir
+
+    @classmethod
+    def signature(cls, path):
+        """ Refs are replaced by renames, which change the mtime of their folder """
+        git_dir = cls.git_dir(path)
+        stats = [paths.signature(git_dir / 'packed-refs')]
+        for root, _dirs, _files in os.walk(git_dir / 'refs' / 'remotes'):
+            stats.append(paths.signature(root))
+        return paths.digest(tuple(stats))
+
+    @classmethod
+    def read(cls, git_dir):
+        refs = set()
+        with suppress(FileNotFoundError), open(git_dir / 'packed-refs', encoding='utf-8') as f:
+            for line in f:
+                _oid, _sep, name = line.rstrip('\n').partition(' ')
+                if name.startswith('refs/remotes/'):
+                    refs.add(name.removeprefix('refs/remotes/'))
+        remotes = git_dir / 'refs' / 'remotes'
+        for root, _dirs, files in os.walk(remotes):
+            refs.update(str((Path(root) / name).relative_to(remotes)) for name in files if not name.endswith('.lock'))
+        return sorted(x for x in refs if not x.endswith('/HEAD'))
+
+    @classmethod
+    def remote_refs(cls, path, signature=None):
+        """ 'remote/branch' names """
+        key = str(Path(path).absolute())
+        signature = signature or cls.signature(path)
+        cached_signature, refs = cls.cache.get(key, (None, None))
+        if cached_signature != signature:
+            refs = cls.read(cls.git_dir(path))
+            cls.cache[key] = (signature, refs)
+        return refs
+
+    @classmethod
+    def branches(cls, path, remote=None):
+        return strip_remote(cls.remote_refs(path), remote)
+
+
+class LsRemoteCache(JsonMixin):
+    """
+        `git ls-remote` outputs by repository, remote and patterns, with the time
+        they were fetched. Expired entries are still used when the remote can't be reached.
+    """
+
+    def __init__(self, path=None, entries=None):
+        self.path = path
+        self.entries = entries or {}
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or Path.home() / '.config' / consts.APPNAME / 'ls-remote.json'
+        cache = cls.load_json(path) or cls()
+        cache.path = path
+        return cache
+
+    def to_json_excluded(self):
+        return ['path'] + super().to_json_excluded()
+
+    def get(self, key):
+        """ (fetched_at, lines), lines is None if there's no entry """
+        fetched_at, lines = self.entries.get(key, [0, None])
+        return fetched_at, lines
+
+    def set(self, key, lines, save=True):
+        self.entries[key] = [time.time(), lines]
+        if save:
+            self.save()
+
+    def clear(self):
+        self.entries = {}
+        self.save()
+
+    def save(self):
+        paths.ensure(Path(self.path).parent)
+        self.save_json(self.path)
+
+    def tips(self, path, remote, ttl):
+        """ {branch: object id} of `remote` from the entries younger than `ttl` seconds """
+        prefix = f"{Path(path).absolute()} {remote}"
+        return {
+            ref.removeprefix('refs/heads/'): oid
+            for key, (fetched_at, lines) in self.entries.items()
+            if (key == prefix or key.startswith(prefix + ' ')) and time.time() - float(fetched_at) < ttl
+            for oid, _sep, ref in (line.partition('\t') for line in lines)
+        }
+
+
+# Seconds before cached ls-remote outputs are queried again
+LS_REMOTE_TTL = 3600
+VERSIONS_TTL = 7 * 24 * 3600
+
+
+class FetchPlan:
+    """
+        Branches to fetch by repository and remote. Each repository and remote pair is
+        fetched by a single `git fetch` with all of its refspecs, i.e. one connection and
+        one negotiation. Branches whose tip, as seen by `ls-remote` less than LS_REMOTE_TTL
+        ago, already is their remote-tracking ref are left out, unless `refresh` is set.
+        With `depth` or `shallow_since`, only that much history is fetched, see `Git.merge_base`.
+    """
+
+    def __init__(self, depth=None, shallow_since=None, refresh=False):
+        self.branches = {}
+        self.refresh = refresh
+        self.shallow = [
+            *([f'--depth={depth}'] if depth else []),
+            *([f'--shallow-since={shallow_since}'] if shallow_since else []),
+        ]
+
+    def add(self, repo_name, remote, *branches):
+        remote_branches = self.branches.setdefault(repo_name, {}).setdefault(remote, [])
+        remote_branches.extend(x for x in branches if x and x not in remote_branches)
+        return self
+
+    def pending(self, path, remote, branches, cache):
+        if self.refresh or not Path(path).is_dir() or not (tips := cache.tips(path, remote, LS_REMOTE_TTL)):
+            return branches
+        worker = RepoWorker.get(path)
+        return [x for x in branches if not tips.get(x) or worker.resolve(f'refs/remotes/{remote}/{x}') != tips[x]]
+
+    def refspecs(self, repo_name, path):
+        """ {remote: refspecs} that still have to be fetched for `repo_name` """
+        cache = LsRemoteCache.load()
+        return {
+            remote: [f'+refs/heads/{x}:refs/remotes/{remote}/{x}' for x in pending]
+            for remote, branches in self.branches.get(repo_name, {}).items()
+            if (pending := self.pending(path, remote, branches, cache))
+        }
+
+    def stages(self, options=''):
+        """
+            Templates for `pl.run` stages, with the fetch commands of each repository.
+            Fetches in the same repository would compete for its locks, there's one stage per remote.
+        """
+        options = ' '.join([*([options] if options else []), *map(shlex.quote, self.shallow)])
+
+        def template(index):
+            def fetch_command(repo_name, repo, _version):
+                remotes = list(self.refspecs(repo_name, repo.path).items())[index:index + 1]
+                return [
+                    f"git -C {repo.path} fetch {options + ' ' if options else ''}{remote} {' '.join(refspecs)}"
+                    for remote, refspecs in remotes
+                ]
+            return fetch_command
+        return [template(index) for index in range(max(map(len, self.branches.values()), default=0))]
+
+    async def fetch_async(self, repo_paths, capture=True):
+        """ Fetch the repositories {name: path} concurrently, one remote after the other """
+        async def fetch_repo(repo_name, path):
+            for remote, refspecs in self.refspecs(repo_name, path).items():
+                await Git.git_async(['fetch', '--progress', *self.shallow, remote, *refspecs], path, capture=capture, check=True)
+        await asyncio.gather(*(fetch_repo(repo_name, path) for repo_name, path in repo_paths.items()))
+
+    def fetch(self, repo_paths):
+        return Git.sync(self.fetch_async(repo_paths, capture=False))
+
+
+# merge bases never change for given commits
+MERGE_BASES = {}
+# Commits a shallow history is first deepened by to find a merge base, doubled at each of the rounds
+DEEPEN_STEP = 64
+DEEPEN_ROUNDS = 6
+
 
 class Git(External):
+    """
+        Git commands are executed without a shell nor a PTY.
+        Every command has a coroutine `*_async` version, so that they can be
+        gathered across repositories, and a synchronous facade that runs it.
+    """
 
     @classmethod
-    async def git_async(cls, args, path):
+    async def git_async(cls, args, path=None, capture=True, check=False):
+        """
+            Run `git *args` in `path`. With `capture`, both pipes are drained concurrently,
+            otherwise the output goes straight to the terminal.
+            The process is killed if the task is cancelled, with its own children if captured,
+            as those run in their own session and process group.
+        """
+        pipe = asyncio.subprocess.PIPE if capture else None
+        proc = await asyncio.create_subprocess_exec(
+            'git', *args,
+            cwd=path,
+            stdout=pipe,
+            stderr=pipe,
+            start_new_session=capture,
+        )
+        try:
+            stdout, stderr = await proc.communicate()
+        except asyncio.CancelledError:
+            kill(proc, group=capture)
+            await proc.wait()
+            raise
+        result = AsyncProc(proc.returncode, decode(stdout), decode(stderr))
+        if check and result.returncode:
+            raise GitError(args, result)
+        return result
+
+    @classmethod
+    async def lines_async(cls, args, path=None, check=False):
+        """ Yield the output lines as they come, for outputs too long to be kept whole """
         proc = await asyncio.create_subprocess_exec(
             'git', *args,
             cwd=path,
             stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            limit=LINE_LIMIT,
+            start_new_session=True,
         )
-        status_code = await proc.wait()
-        stdout, stderr = await proc.communicate()
-        return AsyncProc(status_code, stdout, stderr)
+        try:
+            async for line in proc.stdout:
+                yield decode(line).rstrip('\n')
+            await proc.wait()
+        finally:
+            kill(proc, group=True)
+        if check and proc.returncode:
+            raise GitError(args, AsyncProc(proc.returncode, None, None))
 
     @classmethod
-    async def clean_async(cls, path='.', quiet=False):
-        return await cls.git_async(['clean', f'-xdf{"q" if quiet else ""}'], path)
+    def sync(cls, coroutine):
+        return asyncio.run(coroutine)
 
     @classmethod
-    def clean(cls, path='.', quiet=False):
-        context = invoke.Context()
-        with context.cd(path):
-            return context.run(f'git clean -xdf{"q" if quiet else ""}')
+    def gather(cls, coroutines):
+        """ Run coroutines concurrently, i.e. the same command on many repositories """
+        async def inner():
+            return await asyncio.gather(*coroutines)
+        return asyncio.run(inner())
 
     @classmethod
-    async def reset_async(cls, path='.', hard=False):
-        return await cls.git_async(['reset'] + (['--hard'] if hard else []), path)
+    def clean_args(cls, quiet=False, keep=()):
+        """ `git clean` of the untracked and ignored files, but those matching the `keep` patterns """
+        return ['clean', f'-xdf{"q" if quiet else ""}', *(f'--exclude={x}' for x in keep)]
+
+    @classmethod
+    def clean_command(cls, path, quiet=False, keep=()):
+        """ Command line of `clean_args` for `pl.run` """
+        return shlex.join(['git', '-C', str(path), *cls.clean_args(quiet, keep)])
+
+    @classmethod
+    async def clean_async(cls, path='.', quiet=False, capture=True, keep=()):
+        return await cls.git_async(cls.clean_args(quiet, keep), path, capture=capture, check=not capture)
+
+    @classmethod
+    def clean(cls, path='.', quiet=False, keep=()):
+        return cls.sync(cls.clean_async(path, quiet=quiet, capture=False, keep=keep))
+
+    @classmethod
+    async def reset_async(cls, path='.', hard=False, capture=True):
+        return await cls.git_async(['reset'] + (['--hard'] if hard else []), path, capture=capture, check=not capture)
 
     @classmethod
     def reset(cls, path='.', hard=False, quiet=False):
-        context = invoke.Context()
-        hard_str = '--hard ' if hard else ''
-        with context.cd(path):
-            return context.run(f"git reset {hard_str}")
+        return cls.sync(cls.reset_async(path, hard=hard, capture=False))
 
     @classmethod
     def get_editor(cls):
-        return invoke.Context().run('git config --get core.editor', pty=True, hide=True).stdout.strip()
+        return cls.sync(cls.git_async(['config', '--get', 'core.editor'])).stdout.strip()
 
     @classmethod
     def clone(cls, repository, branch, directory):
@@ -54,138 +428,322 @@ class Git(External):
 
     @classmethod
     def add_remote(cls, name, url, path):
-        context = invoke.Context()
-        with context.cd(path):
-            return context.run(f'git remote add {name} {url}')
+        return cls.sync(cls.git_async(['remote', 'add', name, url], path, capture=False, check=True))
+
+    @classmethod
+    async def status_async(cls, path, extended=False, name=False):
+        """ Short status, or the last commit and the colored branch status if `extended` """
+        if not extended:
+            return await cls.git_async(['status', '-s'], path)
+        log, status = await asyncio.gather(
+            cls.git_async(['log', '--format=   %s (%h)', '-n', '1'], path),
+            cls.git_async(['-c', 'color.status=always', 'status', '-sb'], path),
+        )
+        return AsyncProc(
+            status.returncode,
+            f"\n   {name}/\n{log.stdout}{status.stdout}",
+            log.stderr + status.stderr,
+        )
+
+    @classmethod
+    async def dirty_async(cls, path, untracked=False):
+        """
+            Changed paths from `git status --porcelain=v2`, untracked files only if asked,
+            then `core.untrackedCache` is used if it's enabled.
+        """
+        args = ['status', '--porcelain=v2', f'--untracked-files={"normal" if untracked else "no"}']
+        return [parse_porcelain_path(line) for line in (await cls.git_async(args, path, check=True)).stdout.splitlines()]
+
+    @classmethod
+    async def find_dirty_async(cls, paths, untracked=False, first=True):
+        """
+            Check the repositories {name: path} concurrently, return {name: changed paths}
+            for the dirty ones. With `first`, the checks still running are cancelled
+            as soon as a repository is found dirty.
+        """
+        async def check(name, path):
+            return name, await cls.dirty_async(path, untracked=untracked)
+
+        tasks = [asyncio.create_task(check(name, path)) for name, path in paths.items()]
+        dirty = {}
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                name, changes = await next_done
+                if changes:
+                    dirty[name] = changes
+                    if first:
+                        break
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return dirty
+
+    @classmethod
+    def find_dirty(cls, paths, untracked=False, first=True):
+        return cls.sync(cls.find_dirty_async(paths, untracked=untracked, first=first))
+
+    @classmethod
+    async def status_info_async(cls, path):
+        """ Branch, upstream divergence, counts of changes and last commit, from porcelain outputs """
+        status, log = await asyncio.gather(
+            cls.git_async(['status', '--porcelain=v2', '--branch'], path, check=True),
+            cls.git_async(['log', '-n', '1', '--format=%h%x00%s'], path),
+        )
+        info = dict(branch=None, upstream=None, ahead=0, behind=0, staged=0, unstaged=0, untracked=0, conflicts=0)
+        for line in status.stdout.splitlines():
+            if line.startswith('# branch.head '):
+                info['branch'] = line.split(' ', 2)[2]
+            elif line.startswith('# branch.upstream '):
+                info['upstream'] = line.split(' ', 2)[2]
+            elif line.startswith('# branch.ab '):
+                ahead, behind = line.split(' ')[2:4]
+                info['ahead'], info['behind'] = int(ahead), -int(behind)
+            elif line[:1] in ('1', '2'):
+                info['staged'] += line[2] != '.'
+                info['unstaged'] += line[3] != '.'
+            elif line[:1] == 'u':
+                info['conflicts'] += 1
+            elif line[:1] == '?':
+                info['untracked'] += 1
+        commit, _sep, subject = (log.stdout or '').strip().partition('\0')
+        return {**info, 'commit': commit or None, 'subject': subject or None}
 
     @classmethod
     def status(cls, path, extended=False, name=False):
-        context = invoke.Context()
-        with context.cd(path):
-            if extended:
-                print()
-                print(f"   {name}/")
-                context.run('git log --format="   %s (%h)" -n 1')
-                return context.run('git -c color.status=always status -sb', pty=True)
-            else:
-                return context.run('git status -s', pty=True, hide='out')
+        ret = cls.sync(cls.status_async(path, extended=extended, name=name))
+        if extended:
+            print(ret.stdout, end='')
+        return ret
 
     @classmethod
     def stash(cls, path, message=None):
-        message = f"-m '{message}'" if message else ''
-        path_str = f"-- {path}" if path else ''
-        return invoke.Context().run(f"git stash -a {message} {path_str}")
+        args = ['stash', '-a'] + (['-m', message] if message else []) + (['--', str(path)] if path else [])
+        return cls.sync(cls.git_async(args, capture=False, check=True))
 
     @classmethod
-    async def checkout_async(cls, path, branch, options=None):
-        return await cls.git_async(['checkout', '--progress'] + (options or []) + [branch], path=path)
+    async def checkout_async(cls, path, branch, options=None, capture=True):
+        if isinstance(options, str):
+            options = shlex.split(options)
+        args = ['checkout', '--progress'] + (options or []) + [branch]
+        return await cls.git_async(args, path=path, capture=capture, check=not capture)
 
     @classmethod
     def checkout(cls, path, branch, options=None):
-        context = invoke.Context()
-        with context.cd(path):
-            current_branch = cls.get_current_branch(path)
-            if branch != current_branch:
-                return context.run('git checkout --progress %s %s' % (options or '', branch))
+        async def inner():
+            if branch != await cls.get_current_branch_async(path):
+                return await cls.checkout_async(path, branch, options=options, capture=False)
+            return None
+        return cls.sync(inner())
+
+    @classmethod
+    async def get_current_branch_async(cls, path):
+        return RepoWorker.get(path).current_branch()
+
+    @classmethod
+    def rev_parse(cls, path, rev):
+        """ Object id of `rev`, None if it doesn't exist """
+        return RepoWorker.get(path).resolve(rev)
 
     @classmethod
     def get_current_branch(cls, path):
-        context = invoke.Context()
-        with context.cd(path):
-            return context.run('git branch --show-current', pty=True, hide='out').stdout.strip()
+        return RepoWorker.get(path).current_branch()
 
     @classmethod
-    def get_remote_branches(cls, path, remote=None, worktree=False):
-        context = invoke.Context()
-        with context.cd(path):
-            if worktree:
-                command = f'git ls-remote --heads {remote}'
-            else:
-                command = 'git branch -r' + (('l "' + remote + '/*"') if remote else '')
-            entries = context.run(command, pty=False, hide='out').stdout
-            if worktree:
-                return re.findall(r'refs/heads/(.*)\n', entries)
-            else:
-                len_remote = len(remote) + 1 if remote else 0
-                return [x.strip()[len_remote:] for x in entries.split('\n')]
+    async def get_remote_branches_async(cls, path, remote=None, worktree=False, refresh=False):
+        if worktree:
+            lines = await cls.ls_remote_async(path, remote, refresh=refresh)
+            return [line.partition('refs/heads/')[2] for line in lines if 'refs/heads/' in line]
+        return RefIndex.branches(path, remote)
+
+    @classmethod
+    def get_remote_branches(cls, path, remote=None, worktree=False, refresh=False):
+        if not worktree:
+            return RefIndex.branches(path, remote)
+        return cls.sync(cls.get_remote_branches_async(path, remote=remote, worktree=worktree, refresh=refresh))
+
+    @classmethod
+    def remote_refs(cls, path):
+        return RefIndex.remote_refs(path)
+
+    @classmethod
+    async def ls_remote_async(cls, path, remote, patterns=(), ttl=LS_REMOTE_TTL, refresh=False):
+        """
+            Lines of `git ls-remote --heads`, from the cache if they're younger than `ttl`
+            seconds and no `refresh` is asked, or if the remote can't be reached.
+        """
+        cache = LsRemoteCache.load()
+        key = ' '.join([str(Path(path).absolute()), remote, *patterns])
+        fetched_at, lines = cache.get(key)
+        if lines is not None and not refresh and time.time() - fetched_at < ttl:
+            return lines
+        try:
+            proc = await cls.git_async(['ls-remote', '--heads', remote, *patterns], path, check=True)
+        except GitError as e:
+            if lines is None:
+                raise
+            age = (time.time() - fetched_at) / 3600
+            print(f"{e}\nUsing the branches of {remote} cached {age:.1f} hours ago", file=sys.stderr)
+            return lines
+        lines = proc.stdout.splitlines()
+        cache.set(key, lines)
+        return lines
+
+    @classmethod
+    async def remote_tip_async(cls, path, remote, branch, refresh=False):
+        """ Object id of `branch` on `remote` as `ls_remote_async` tells, None if it's unknown """
+        try:
+            lines = await cls.ls_remote_async(path, remote, [f'refs/heads/{branch}'], refresh=refresh)
+        except GitError:
+            return None
+        return next((oid for oid, _sep, ref in (x.partition('\t') for x in lines) if ref == f'refs/heads/{branch}'), None)
 
     @classmethod
     def diff(cls, path, repo_name):
-        context = invoke.Context()
-        with context.cd(path):
-            print(f'{repo_name}:: {"-" * (80 - len(repo_name))}')
-            return context.run('git diff')
+        print(f'{repo_name}:: {"-" * (80 - len(repo_name))}')
+        return cls.sync(cls.git_async(['diff'], path, capture=False, check=True))
+
+    @classmethod
+    async def diff_with_merge_base_async(cls, path, base_branch, target_branch="HEAD"):
+        merge_base = await cls.merge_base_deepening_async(path, base_branch, target_branch)
+        return [
+            x.strip()
+            async for x in cls.lines_async(['diff', '--name-only', f'{merge_base}...{target_branch}'], path, check=True)
+            if x
+        ]
 
     @classmethod
     def diff_with_merge_base(cls, path, base_branch, target_branch="HEAD"):
-        merge_base = cls.merge_base(path, base_branch, target_branch)
-        context = invoke.Context()
-        command = f'git diff --name-only {merge_base}...{target_branch}'
-        with context.cd(path):
-            return [
-                x.strip()
-                for x in context.run(command, pty=False, hide='out').stdout.split('\n')
-                if x
-            ]
-
-    @classmethod
-    async def fetch_async(cls, path, repo_name, remote_name, branch_name):
-        return await cls.git_async(
-            ['fetch', '--progress', '--verbose', remote_name, branch_name],
-            path=path
-        )
+        return cls.sync(cls.diff_with_merge_base_async(path, base_branch, target_branch))
+
+    @classmethod
+    async def fetch_async(cls, path, repo_name, remote_name, branch_name, options=None, capture=True):
+        if isinstance(options, str):
+            options = shlex.split(options)
+        args = ['fetch', '--progress', '--verbose', remote_name] + ([branch_name] if branch_name else []) + (options or [])
+        return await cls.git_async(args, path=path, capture=capture, check=not capture)
 
     @classmethod
     def fetch(cls, path, repo_name, remote_name, branch_name, options=None):
-        context = invoke.Context()
-        with context.cd(path):
-            command = f"git fetch --progress --verbose {remote_name} {branch_name} {options or ''}"
-            return context.run(command)
+        return cls.sync(cls.fetch_async(path, repo_name, remote_name, branch_name, options=options, capture=False))
 
     @classmethod
     def push(cls, path, force=False):
-        context = invoke.Context()
-        with context.cd(path):
-            return context.run(f'git push {"-ff" if force else ""}')
+        return cls.sync(cls.git_async(['push'] + (['-ff'] if force else []), path, capture=False, check=True))
 
     @classmethod
     def pull(cls, path, remote, branch_name):
-        context = invoke.Context()
-        with context.cd(path):
-            return context.run(f'git pull {remote} {branch_name}')
+        return cls.sync(cls.pull_async(path, remote, branch_name, capture=False))
 
     @classmethod
-    async def pull_async(cls, path, remote, branch_name):
-        return await cls.git_async(['pull', remote, branch_name], path=path)
+    async def pull_async(cls, path, remote, branch_name, capture=True):
+        return await cls.git_async(['pull', remote, branch_name], path=path, capture=capture, check=not capture)
 
     @classmethod
-    def worktree_add(cls, branch, path, new=False):
-        context = invoke.Context()
-        with context.cd(path):
-            return context.run(f'git worktree add ../{branch} {branch}')
+    async def worktree_add_async(cls, path, worktree_path, branch, start_point=None, detach=False):
+        """
+            Check `branch` out in a new worktree of the repository at `path`, reset to `start_point` if given.
+            A branch can only be checked out in one worktree, `detach` checks out its start point instead.
+        """
+        if detach:
+            args = ['--detach', str(worktree_path), start_point or branch]
+        else:
+            args = ['-B', branch, str(worktree_path), *([start_point] if start_point else [])]
+        return await cls.git_async(['worktree', 'add', '--quiet', *args], path, check=True)
+
+    @classmethod
+    def worktree_add(cls, path, worktree_path, branch, start_point=None, detach=False):
+        return cls.sync(cls.worktree_add_async(path, worktree_path, branch, start_point, detach))
+
+    @classmethod
+    async def worktree_list_async(cls, path):
+        """ {worktree path: checked out branch or None} of the repository at `path`, pruned first """
+        await cls.git_async(['worktree', 'prune'], path, check=True)
+        worktrees = {}
+        async for line in cls.lines_async(['worktree', 'list', '--porcelain'], path, check=True):
+            key, _sep, value = line.partition(' ')
+            if key == 'worktree':
+                worktree = value
+                worktrees[worktree] = None
+            elif key == 'branch':
+                worktrees[worktree] = value.removeprefix('refs/heads/')
+        return worktrees
+
+    @classmethod
+    async def worktree_remove_async(cls, path, worktree_path):
+        """ Remove the worktree and its untracked and ignored files """
+        return await cls.git_async(['worktree', 'remove', '--force', str(worktree_path)], path, check=True)
 
     @classmethod
     def merge_base(cls, path, branch1, branch2):
-        context = invoke.Context()
-        command = f'git merge-base {branch1} {branch2}'
-        with context.cd(path):
-            return context.run(command, pty=True, hide='out').stdout.strip()
+        if merge_base := MERGE_BASES.get(cls.merge_base_key(path, branch1, branch2)):
+            return merge_base
+        return cls.sync(cls.merge_base_deepening_async(path, branch1, branch2))
+
+    @classmethod
+    async def merge_base_deepening_async(cls, path, branch1, branch2):
+        """
+            Merge base that may be cut out of a shallow repository. The remote branches among `branch1`
+            and `branch2` are then deepened as far as needed, DEEPEN_STEP commits doubled at each round,
+            before fetching their whole history.
+        """
+        for deepen in [*(DEEPEN_STEP * 2 ** x for x in range(DEEPEN_ROUNDS)), None]:
+            try:
+                return await cls.merge_base_async(path, branch1, branch2)
+            except GitError:
+                if not await cls.is_shallow_async(path):
+                    raise
+            await cls.deepen_async(path, [branch1, branch2], deepen)
+        return await cls.merge_base_async(path, branch1, branch2)
+
+    @classmethod
+    async def is_shallow_async(cls, path):
+        return (await cls.git_async(['rev-parse', '--is-shallow-repository'], path, check=True)).stdout.strip() == 'true'
+
+    @classmethod
+    async def deepen_async(cls, path, refs, deepen=None):
+        """ Fetch `deepen` more commits of the remote-tracking `refs`, their whole history if None """
+        by_remote = {}
+        for ref in refs:
+            remote, _sep, branch = ref.removeprefix('refs/remotes/').partition('/')
+            if branch and RepoWorker.get(path).resolve(f'refs/remotes/{remote}/{branch}'):
+                by_remote.setdefault(remote, []).append(f'+refs/heads/{branch}:refs/remotes/{remote}/{branch}')
+        if not by_remote:
+            raise GitError(['fetch', '--deepen'], AsyncProc(1, '', f"no remote branch to deepen among {refs}"))
+        option = f'--deepen={deepen}' if deepen else '--unshallow'
+        # one remote after the other, they'd compete for the repository's locks
+        for remote, refspecs in by_remote.items():
+            await cls.git_async(['fetch', option, remote, *refspecs], path, check=True)
+
+    @classmethod
+    def merge_base_key(cls, path, branch1, branch2):
+        worker = RepoWorker.get(path)
+        return (worker.path, worker.resolve(branch1), worker.resolve(branch2))
 
     @classmethod
     async def merge_base_async(cls, path, branch1, branch2):
-        return await cls.git_async(['merge-base', branch1, branch2], path=path)
+        """ Revisions are resolved by the repository worker, git only runs for new pairs of commits """
+        key = cls.merge_base_key(path, branch1, branch2)
+        if None in key or key not in MERGE_BASES:
+            merge_base = (await cls.git_async(['merge-base', branch1, branch2], path=path, check=True)).stdout.strip()
+            if None in key:
+                return merge_base
+            MERGE_BASES[key] = merge_base
+        return MERGE_BASES[key]
 
     @classmethod
-    def all_remote_branches(cls, path, remote, filter_func=None):
-        context = invoke.Context()
-        command = f"git ls-remote --heads {remote} 'refs/heads/??.?' 'refs/heads/saas-??.?'"
+    async def all_remote_branches_async(cls, path, remote, filter_func=None, refresh=False):
+        patterns = ('refs/heads/??.?', 'refs/heads/saas-??.?')
         pattern = r'.*refs/heads/(?P<version>(?:saas-)?(?P<number>\d\d\.\d))$'
-        with context.cd(path):
-            versions_lines = context.run(command, pty=True, hide='out').stdout.strip()
+        versions_lines = await cls.ls_remote_async(path, remote, patterns, ttl=VERSIONS_TTL, refresh=refresh)
         versions = {}
-        for line in (x.strip() for x in versions_lines.splitlines()):
+        for line in (x.strip() for x in versions_lines if x.strip()):
             if version_data := re.match(pattern, line).groupdict():
                 number = float(version_data.get('number'))
                 if not filter_func or filter_func(number):
                     versions[number] = version_data.get('version')
         return [x[1] for x in sorted(versions.items())]
+
+    @classmethod
+    def all_remote_branches(cls, path, remote, filter_func=None, refresh=False):
+        return cls.sync(cls.all_remote_branches_async(path, remote, filter_func=filter_func, refresh=refresh))
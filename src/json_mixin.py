@@ -1,26 +1,54 @@
+import copy
 import json
 from pathlib import Path
 import re
 
+from paths import atomic_write, locked
+
+MISSING = object()
+
+
+def merge(base, ours, theirs):
+    """ Three-way merge of JSON data: what changed from `base` to `ours`, applied over `theirs` """
+    if ours == base:
+        return theirs
+    if not all(isinstance(x, dict) for x in (base, ours, theirs)):
+        return ours
+    merged = {
+        key: merge(base.get(key, MISSING), ours.get(key, MISSING), theirs.get(key, MISSING))
+        for key in {**theirs, **ours}
+    }
+    return {key: value for key, value in merged.items() if value is not MISSING}
+
 
 class JsonMixin:
 
-    @classmethod
-    def load_json(cls, fullpath):
+    @staticmethod
+    def read_json(fullpath):
+        """ Data of the file, None if it doesn't exist """
         if not fullpath or not Path(fullpath).exists():
-            return {}
+            return None
         with open(fullpath, encoding="utf-8") as f:
             content = f.read() or "{}"
         content = re.sub(r"#.*\n", "", content)
-        data = json.loads(content)
-        return cls.from_json(data)
+        return json.loads(content)
+
+    @classmethod
+    def load_json(cls, fullpath):
+        if (data := cls.read_json(fullpath)) is None:
+            return {}
+        result = cls.from_json(data)
+        result._stored = result.to_json()
+        # from_json may keep parts of `data`, that the object then changes
+        result._loaded = copy.deepcopy(data)
+        return result
 
     @classmethod
     def from_json(cls, data):
         return cls(**data)
 
     def to_json_excluded(self):
-        return []
+        return ['_stored', '_loaded']
 
     def to_json(self):
         def to_json_inner(subvalue):
@@ -41,10 +69,46 @@ class JsonMixin:
         data = to_json_inner(self.__dict__)
         return json.dumps(data, indent=4)
 
+    def is_dirty(self, data=None):
+        """ Whether the content differs from what was last loaded or saved """
+        return (data or self.to_json()) != getattr(self, '_stored', None)
+
+    def refresh_json(self, data, keys):
+        """ Take the values of the top level `keys` of `data` """
+        fresh = self.from_json(data)
+        for key in keys:
+            if isinstance(self, dict) and key not in vars(fresh):
+                if key in fresh:
+                    self[key] = fresh[key]
+                else:
+                    self.pop(key, None)
+            else:
+                setattr(self, key, getattr(fresh, key))
+
     def save_json(self, fullpath):
+        """
+            Atomically write the file if the content has changed, returns whether it was written.
+            The file is read again under the lock, and what other processes saved since it was
+            loaded is kept: only the changes made here are applied over it.
+        """
         data = self.to_json()
-        with open(fullpath, 'w+', encoding='utf-8') as f:
-            f.write(data)
+        if not self.is_dirty(data) and Path(fullpath).exists():
+            return False
+        with locked(fullpath):
+            # the content of the file when it was loaded or last saved from here
+            base = getattr(self, '_loaded', {})
+            if (current := self.read_json(fullpath)) is not None and current != base:
+                ours = json.loads(data)
+                merged = merge(base, ours, current)
+                self.refresh_json(merged, [
+                    key for key in {**merged, **ours}
+                    if merged.get(key, MISSING) != ours.get(key, MISSING)
+                ])
+                data = json.dumps(merged, indent=4)
+            atomic_write(fullpath, data)
+        self._stored = data
+        self._loaded = json.loads(data)
+        return True
 
     def __str__(self):
         return self.to_json()
@@ -2,6 +2,47 @@ from json_mixin import JsonMixin
 
 
 class MergeCache(JsonMixin):
-    def __init__(self, **kwargs):
-        for key, value in kwargs.items():
-            setattr(self, key, value)
+    """
+        Base versions index, by repository:
+        - `tips`: {version: tip} the fork points were computed from,
+        - `bases`: {fork point of the version from master: version},
+        - `commits`: {branch tip: version} already resolved through `bases`.
+        Only the versions whose tip moved need their fork point computed again.
+    """
+
+    def __init__(self, versions=None, repos=None, **legacy):
+        self.versions = versions or []
+        self.repos = repos or {}
+        # former format, a flat {fork point: version} by repository
+        for repo_name, bases in legacy.items():
+            if isinstance(bases, dict):
+                self.index(repo_name)['bases'].update(bases)
+
+    @classmethod
+    def load(cls, path):
+        return cls.load_json(path) or cls()
+
+    def index(self, repo_name):
+        index = self.repos.setdefault(repo_name, {})
+        for key in ('tips', 'bases', 'commits'):
+            index.setdefault(key, {})
+        return index
+
+    def moved(self, repo_name, tips):
+        """ Versions of {version: tip} whose fork point wasn't computed from that tip """
+        known = self.index(repo_name)['tips']
+        return [version for version, tip in tips.items() if tip and known.get(version) != tip]
+
+    def set_fork_point(self, repo_name, version, tip, fork_point):
+        index = self.index(repo_name)
+        index['tips'][version] = tip
+        index['bases'] = {k: v for k, v in index['bases'].items() if v != version}
+        index['bases'][fork_point] = version
+
+    def base(self, repo_name, commit):
+        """ Base version of an already resolved commit, or of a fork point """
+        index = self.index(repo_name)
+        return index['commits'].get(commit) or index['bases'].get(commit)
+
+    def remember(self, repo_name, commit, version):
+        self.index(repo_name)['commits'][commit] = version
@@ -1,23 +1,63 @@
 import click
+import importlib
 import typer
+import typer.main
 import sys
 
 import consts
+from completion import BranchIndex, CompletionIndex
 from merge_cache import MergeCache
 from pathlib import Path
-from paths import digest, parent_digests
+from paths import digest, dir_names, parent_digests, signature
 from project import Projects
+from typer.core import TyperGroup
+from workspace import Workspace
+
+
+class LazyGroup(TyperGroup):
+    """
+        Root group that imports the module of a subcommand group only when
+        the group is dispatched, so that `ocli` doesn't pay for every command.
+    """
+
+    def list_commands(self, ctx):
+        for name in odev.subcommands:
+            self.get_command(ctx, name)
+        self.commands.update(odev.load_toplevel())
+        return super().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        if name not in self.commands:
+            if name in odev.subcommands:
+                self.commands[name] = odev.load_subcommand(name)
+            else:
+                self.commands.update(odev.load_toplevel())
+        return super().get_command(ctx, name)
 
 
 class Odev(typer.Typer):
 
     def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+        super().__init__(*args, cls=LazyGroup, **kwargs)
+        self.subcommands = {}
+        self.loaded = {}
+        self.callback()(self.main)
         self.workspace = None
         self.repo = None
 
-        self.setup_fixed_paths()
-        self.projects = Projects.load(self.paths.projects)
+        self.setup()
+
+        self.db = self._subcommand("db", help="Manage Odoo database")
+        self.path = self._subcommand("path", help="Get paths info")
+        self.git = self._subcommand("git", help="Git operations on all repos")
+        self.workspace = self._subcommand("workspace", help="Workspace operations")
+        self.slot = self._subcommand("slot", help="Manage save slots")
+        self.odoo = self._subcommand("odoo", help="Odoo operations")
+        self.daemon = self._subcommand("daemon", help="Manage the background server")
+
+    def setup(self, cwd=None):
+        self.setup_fixed_paths(cwd)
+        self.projects = self.load(Projects.load, self.paths.projects)
         self.projects.save()
         self.project = self.setup_current_project()
         try:
@@ -28,30 +68,61 @@ class Odev(typer.Typer):
             sys.exit("Project not found in folder")
         if self.project:
             self.setup_variable_paths()
-            self.merge_cache = MergeCache.load_json(self.paths.cache)
+            self.merge_cache = self.load(MergeCache.load, self.paths.cache)
+            self.index = self.load(CompletionIndex.load, self.paths.index)
             self.reload_workspaces()
 
-        self.db = self._subcommand("db", help="Manage Odoo database")
-        self.path = self._subcommand("path", help="Get paths info")
-        self.git = self._subcommand("git", help="Git operations on all repos")
-        self.workspace = self._subcommand("workspace", help="Workspace operations")
-        self.slot = self._subcommand("slot", help="Manage save slots")
-        self.odoo = self._subcommand("odoo", help="Odoo operations")
+    def load(self, loader, path):
+        """
+            Memoize `loader(path)` until `path` changes on disk.
+            It only pays off when the process is reused, i.e. by the daemon.
+        """
+        key = (loader, str(path))
+        current = signature(path)
+        if (cached := self.loaded.get(key)) and cached[0] == current:
+            return cached[1]
+        value = loader(path)
+        self.loaded[key] = (current, value)
+        return value
+
+    def main(self):
+        """
+            Helps you develop Odoo.
+        """
 
     def _subcommand(self, name, **kwargs):
-        subcommand = typer.Typer(no_args_is_help=True)
-        self.add_typer(subcommand, name=name, **kwargs)
+        subcommand = typer.Typer(name=name, no_args_is_help=True, **kwargs)
+        self.subcommands[name] = subcommand
         return subcommand
 
+    def load_subcommand(self, name):
+        module = importlib.import_module(f"commands.{name}")
+        group = typer.main.get_group(self.subcommands[name])
+        if self.project:
+            # so that shell completion can answer without importing the module
+            self.index.set_commands(name, group, signature(module.__file__))
+        return group
+
+    def load_toplevel(self):
+        importlib.import_module("commands.common")
+        return typer.main.get_group(self).commands
+
+    def branch_index(self):
+        """ The remote branches, only loaded when they're needed """
+        return self.load(BranchIndex.load, self.paths.branches)
+
     def reload_workspaces(self):
-        self.workspaces = sorted([x.name for x in self.paths.workspaces.iterdir()])
+        current = signature(self.paths.workspaces)
+        if list(current or []) != self.index.workspaces_signature:
+            self.index.set_workspaces(dir_names(self.paths.workspaces), current)
+        self.workspaces = self.index.workspaces
 
-    def setup_fixed_paths(self):
+    def setup_fixed_paths(self, cwd=None):
         class Paths:
             pass
         self.paths = Paths()
         self.paths.config = Path.home() / '.config' / consts.APPNAME
-        self.paths.starting = Path.cwd().absolute()
+        self.paths.starting = Path(cwd or Path.cwd()).absolute()
         self.paths.projects = self.paths.config / 'projects.json'
         return self.paths
 
@@ -63,12 +134,24 @@ class Odev(typer.Typer):
     def setup_variable_paths(self):
         self.paths.project = Path(self.project.path)
         self.paths.relative = lambda x: self.paths.project / x
-        self.paths.repo = self.paths.relative
+        self.paths.repo = self.repo_path
+        self.paths.worktree = lambda name: self.paths.project / '.worktrees' / name
+        self.paths.root = lambda name: self.paths.worktree(name) if self.project.worktrees else self.paths.project
         self.paths.workspaces = self.paths.config / 'workspaces' / digest(self.paths.project)
         self.paths.cache = self.paths.workspaces / "cache.json"
+        self.paths.index = self.paths.config / 'index' / f"{digest(self.paths.project)}.json"
+        self.paths.branches = BranchIndex.path_of(self.paths.index)
         self.paths.workspace = lambda name: self.paths.workspaces / name
         self.paths.workspace_file = lambda name: self.paths.workspace(name) / f"{name}.json"
         self.paths.hook_file = lambda name: self.paths.workspace(name) / "post_hook.py"
+        self.paths.warmup = lambda name: self.paths.workspace(name) / "warmup.json"
+        self.paths.worktrees = self.paths.workspaces / "worktrees.json"
+
+    def repo_path(self, repo_name):
+        """ Checkout of the repository for the current workspace, its own worktree if the project uses them """
+        if isinstance(self.workspace, Workspace) and self.workspace.path:
+            return Path(self.workspace.path) / repo_name
+        return self.paths.project / repo_name
 
 
 odev = Odev(rich_markup_mode=False)
@@ -1,6 +1,5 @@
 # ruff: noqa: T201
 
-import invoke
 from tempfile import NamedTemporaryFile
 
 from external import External
@@ -21,6 +20,7 @@ class Odoo(External):
         stop = kwargs.get('stop')
         demo = kwargs.get('demo')
         do_autoinstall = kwargs.get('do_autoinstall')
+        warmup = kwargs.get('warmup')
 
         addons_path = ",".join(str(x) for x in (workspace.addons_path or []))
         upgrade_path = ",".join(str(x) for x in (workspace.upgrade_path or []))
@@ -33,7 +33,9 @@ class Odoo(External):
             print(f"    upgrade_path: {upgrade_path}")
             print(f"    extra_config: {workspace.extra_config}")
             print(f"    database: {workspace.db_name}")
-        print(f"    Virtualenv: {Path(venv_path).relative_to(base_path)}")
+        if Path(venv_path).is_relative_to(base_path):
+            venv_path = Path(venv_path).relative_to(base_path)
+        print(f"    Virtualenv: {venv_path}")
         if modules:
             print(f"    Modules: {modules}")
         if options:
@@ -44,6 +46,8 @@ class Odoo(External):
             print(f"    Stop: {stop}")
         print(f"    Demo data: {demo}")
         print(f"    Autoinstall: {do_autoinstall}")
+        if warmup:
+            print(f"    Bytecode: {warmup}")
         print(f"{80 * '-'}")
 
     @classmethod
@@ -64,9 +68,12 @@ class Odoo(External):
         stop=False,
         in_stream=None,
         env_vars=None,
+        warmup=None,
     ):
         project_path = Path(project.path)
-        bin_path = project_path / 'odoo'
+        # the repositories are in the workspace's worktrees if the project uses them
+        workspace_path = Path(workspace.path or project_path)
+        bin_path = workspace_path / 'odoo'
         venv_path = project_path / workspace.venv_path
 
         options = options or ''
@@ -94,11 +101,12 @@ class Odoo(External):
             stop=stop,
             workspace=workspace,
             do_autoinstall=do_autoinstall,
+            warmup=warmup,
         )
 
         extra_config = {
-            "addons_path": ",".join(str(project_path / x) for x in (workspace.addons_path or [])),
-            "upgrade_path": ",".join(str(project_path / x) for x in (workspace.upgrade_path or [])),
+            "addons_path": ",".join(str(workspace_path / x) for x in (workspace.addons_path or [])),
+            "upgrade_path": ",".join(str(workspace_path / x) for x in (workspace.upgrade_path or [])),
             "db_name": workspace.db_name or 'odoo',
             **workspace.extra_config,
         }
@@ -108,6 +116,7 @@ class Odoo(External):
             for k, v in (extra_config or {}).items():
                 tfile.write(f"{k}={v}\n")
             tfile.close()
+            import invoke
             context = invoke.Context()
             with context.cd(bin_path):
                 venv_script_path = project_path / Path(workspace.venv_path) / 'bin' / 'activate'
@@ -140,6 +149,7 @@ class Odoo(External):
 
     @classmethod
     def l10n_tests(cls, bin_path, db_name, venv_path):
+        import invoke
         context = invoke.Context()
         with context.cd(bin_path):
             venv_script_path = Path(venv_path) / 'bin' / 'activate'
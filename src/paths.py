@@ -1,3 +1,7 @@
+import fcntl
+import os
+import tempfile
+from contextlib import contextmanager, suppress
 from hashlib import md5
 from pathlib import Path
 from functools import lru_cache
@@ -22,6 +26,98 @@ def digest(path):
     return hasher.hexdigest()
 
 
+def signature(path):
+    """
+        Cheap change marker for a file or folder, None if it doesn't exist.
+        Atomic replaces change the inode, folders change mtime on new entries.
+    """
+    try:
+        stat = Path(path).stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def dir_names(path):
+    return sorted(x.name for x in Path(path).iterdir() if x.is_dir())
+
+
+def disk_usage(path):
+    """ Bytes allocated to the files under `path`, hard links counted once """
+    seen, total = set(), 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            with suppress(OSError):
+                stat = os.lstat(os.path.join(root, name))
+                if (stat.st_dev, stat.st_ino) not in seen:
+                    seen.add((stat.st_dev, stat.st_ino))
+                    total += stat.st_blocks * 512
+    return total
+
+
+def prune_bytecode(*roots, skip=('.git', 'node_modules', '.venv')):
+    """
+        Remove the compiled files of the `__pycache__` folders under `roots` whose source is gone,
+        and the folders left empty, so that kept caches don't make deleted modules importable.
+        Returns how many went.
+    """
+    removed = 0
+    for path in map(Path, roots):
+        for root, dirs, _files in os.walk(path):
+            dirs[:] = [x for x in dirs if x not in skip]
+            if '__pycache__' not in dirs:
+                continue
+            dirs.remove('__pycache__')
+            folder = Path(root)
+            for compiled in (folder / '__pycache__').glob('*.pyc'):
+                if not (folder / f"{compiled.name.split('.')[0]}.py").exists():
+                    with suppress(FileNotFoundError):
+                        compiled.unlink()
+                        removed += 1
+            with suppress(OSError):
+                (folder / '__pycache__').rmdir()
+                while folder != path:
+                    folder.rmdir()
+                    folder = folder.parent
+    return removed
+
+
 def parent_digests(path):
     for subpath in (path, *path.parents):
         yield digest(subpath)
+
+
+@contextmanager
+def locked(path):
+    """
+        Exclusive advisory lock on a `<path>.lock` sidecar file,
+        serializing writers across concurrent invocations.
+    """
+    path = Path(path)
+    with open(path.with_name(f"{path.name}.lock"), "a", encoding="utf-8") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def atomic_write(path, data, encoding="utf-8"):
+    """
+        Write to a temporary file in the same folder, then rename it over `path`,
+        so that readers never see a truncated file.
+    """
+    path = Path(path)
+    mode = path.stat().st_mode if path.exists() else 0o644
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding=encoding) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.unlink(temp_path)
+        raise
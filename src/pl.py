@@ -2,71 +2,380 @@
 # ruff: noqa: T201
 
 import asyncio
-import io
+import codecs
+import gzip
+import json
 import os
 import shlex
 import sys
-from contextlib import suppress
+import tempfile
+import time
+from collections import deque, namedtuple
+from contextlib import AsyncExitStack, ExitStack, suppress
 from functools import wraps
+from itertools import islice
+from pathlib import Path
 
 from rich.console import Console, Group
 from rich.live import Live
 from rich.text import Text
 
 
+# Max frames per second of the live view
+FPS = 10
+# Max chunks of output waiting to be rendered, producers wait when it's full
+QUEUE_SIZE = 64
+CHUNK_SIZE = 2 ** 18
+# Max concurrent jobs, overall and by resource class, see `configure`
+JOBS = max(8, os.cpu_count() or 0)
+LIMITS = {"network": 4, "disk": None}
+NETWORK_GIT_COMMANDS = ("fetch", "pull", "push", "ls-remote", "clone")
+# Seconds before a command is killed by resource class, none unless set by `configure_timeouts`
+TIMEOUTS = {"network": None, "disk": None}
+# Transient network failures are retried, waiting BACKOFF seconds, doubled every attempt
+RETRY_GIT_COMMANDS = ("fetch", "pull", "ls-remote")
+RETRIES = 2
+BACKOFF = 1
+MAX_BACKOFF = 30
+# Cancel all the commands as soon as one fails
+FAIL_FAST = False
+# Print results as JSON lines instead of the output summary
+JSON_OUTPUT = False
+
+Result = namedtuple('Result', [  # noqa: PYI024
+    'name', 'command', 'repo', 'version', 'returncode', 'stdout', 'stderr',
+    'started_at', 'finished_at', 'duration', 'attempts', 'outcome',
+])
+
+
+def parse_spec(spec):
+    """ Yield (resource, value) pairs from a spec like "8,network=2", resource is '' for a bare value """
+    for item in (x.strip() for x in (spec or '').split(',') if x.strip()):
+        resource, _sep, value = item.rpartition('=')
+        if not value.isdigit():
+            raise ValueError(f"Invalid specification: {item}")
+        yield resource, int(value) or None
+
+
+def configure(spec=None):
+    """
+        Set the max concurrent jobs from a spec like "8" or "8,network=2,disk=4".
+        Zero means no limit.
+    """
+    global JOBS
+    for resource, value in parse_spec(spec):
+        if resource:
+            LIMITS[resource] = value
+        else:
+            JOBS = value
+
+
+def configure_timeouts(spec=None):
+    """
+        Set the timeouts in seconds from a spec like "60" or "network=120".
+        A bare value applies to all the resource classes, zero means no timeout.
+    """
+    for resource, value in parse_spec(spec):
+        for key in ([resource] if resource else list(TIMEOUTS)):
+            TIMEOUTS[key] = value
+
+
+def echo(*args):
+    """ Print a message for the user, on stderr with `JSON_OUTPUT` so that stdout only holds the results """
+    print(*args, file=sys.stderr if JSON_OUTPUT else sys.stdout)
+
+
+def collapse(line):
+    """ Keep what a terminal would show of a line that's rewritten with carriage returns """
+    return line.rstrip("\r").rsplit("\r", 1)[-1]
+
+
+class LineReader:
+    """
+        Split a byte stream in lines, decoding UTF-8 incrementally, so that
+        neither multibyte characters nor lines can be broken across chunks.
+    """
+
+    def __init__(self):
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.partial = ""
+
+    def feed(self, chunk, final=False):
+        *lines, self.partial = (self.partial + self.decoder.decode(chunk, final=final)).split("\n")
+        # progress output rewrites the same line without ever ending it, don't let it grow
+        self.partial = self.partial[self.partial.rfind("\r", 0, -1) + 1:]
+        if final and self.partial:
+            lines.append(self.partial)
+            self.partial = ""
+        return [collapse(line) for line in lines]
+
+
+def git_subcommand(args):
+    if not args or Path(args[0]).name != 'git':
+        return None
+    args = iter(args[1:])
+    for arg in args:
+        if arg in ('-C', '-c'):
+            next(args, None)
+        elif not arg.startswith('-'):
+            return arg
+    return None
+
+
+class Scheduler:
+    """
+        Queues the commands so that at most `jobs` run at once,
+        and at most `limits[resource]` for each resource class.
+    """
+
+    def __init__(self, jobs=None, limits=None, fail_fast=False):
+        self.jobs = asyncio.Semaphore(jobs) if jobs else None
+        self.limits = {
+            resource: asyncio.Semaphore(limit)
+            for resource, limit in (limits or {}).items()
+            if limit
+        }
+        self.fail_fast = fail_fast
+        self.aborted = False
+        self.running = set()
+
+    def abort(self):
+        """ Cancel the running commands, the queued ones won't start """
+        self.aborted = True
+        for command in self.running:
+            command.cancel()
+
+    async def run(self, command, queue):
+        for dependency in command.after:
+            await dependency.done.wait()
+        if self.aborted or any(dependency.failed for dependency in command.after):
+            command.skip(cancelled=self.aborted)
+            return None
+        async with AsyncExitStack() as stack:
+            for semaphore in (self.limits.get(command.resource), self.jobs):
+                if semaphore:
+                    await stack.enter_async_context(semaphore)
+            if self.aborted:
+                command.skip(cancelled=True)
+                return None
+            self.running.add(command)
+            try:
+                process = await command.run(queue)
+            finally:
+                self.running.discard(command)
+            if command.failed and self.fail_fast and not self.aborted:
+                self.abort()
+            return process
+
+
 class Command:
     MAX_LINES = 8
+    # lines kept in memory, the full stdout goes to the log file
+    RING_LINES = 200
 
-    def __init__(self, name, cwd, command, output):
+    def __init__(self, name, cwd, command, output, after=None, repo=None, version=None):
         self.name = name
+        self.line = command
         self.command = shlex.split(command)
         self.cwd = cwd
         self.process = None
-        self._buffer = []
+        self._buffer = deque(maxlen=self.RING_LINES)
+        self.lines = 0
+        self.log_path = None
+        self._log = None
+        self._rendered = (-1, None)
         self.output = output
+        subcommand = git_subcommand(self.command)
+        self.resource = "network" if subcommand in NETWORK_GIT_COMMANDS else "disk"
+        self.timeout = TIMEOUTS.get(self.resource)
+        self.retries = RETRIES if subcommand in RETRY_GIT_COMMANDS else 0
+        self.attempts = 0
+        self.timed_out = False
+        self.cancelled = False
+        self.queued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.after = after or []
+        self.done = asyncio.Event()
+        self.skipped = False
+        self.repo = repo
+        self.version = version
+        self._stderr = deque(maxlen=self.RING_LINES)
+
+    @property
+    def failed(self):
+        return self.skipped or self.timed_out or bool(self.process and self.process.returncode)
+
+    @property
+    def outcome(self):
+        if not self.failed:
+            return "ok"
+        if self.skipped:
+            return "cancelled" if self.cancelled else "skipped"
+        if self.cancelled:
+            return "cancelled"
+        return "timeout" if self.timed_out else "failed"
+
+    @property
+    def status(self):
+        if self.skipped:
+            return self.outcome
+        if not self.started_at:
+            return "queued"
+        attempt = f" (attempt {self.attempts}/{self.retries + 1})" if self.attempts > 1 else ""
+        if not self.finished_at:
+            return f"running {time.time() - self.started_at:.1f}s{attempt}"
+        return f"{'done' if not self.failed else self.outcome} {self.finished_at - self.started_at:.1f}s{attempt}"
 
     def append(self, line):
-        self._buffer.append(line)
+        self.extend([line])
 
-    async def run(self, queue):
+    def extend(self, lines, stderr=False):
+        """ Both streams are shown, only stdout is logged, stderr is kept apart when not merged """
+        self._buffer.extend(lines)
+        self.lines += len(lines)
+        if stderr:
+            self._stderr.extend(lines)
+        elif self._log:
+            self._log.write("\n".join(lines) + "\n")
+
+    def render(self):
+        """ Title and output tail, the latter is only rebuilt when new lines came in """
+        title = f"{' '.join(self.command)} [{self.status}]"
+        bar = f"{title} {'-' * (100 - len(title))}"
+        rendered_lines, body = self._rendered
+        if rendered_lines != self.lines:
+            tail = list(islice(reversed(self._buffer), self.MAX_LINES))[::-1]
+            body = Text.assemble(*(
+                item
+                for idx, line in enumerate(tail, self.lines - len(tail) + 1)
+                for item in (Text(f"{idx:03}  ", style="dim"), Text(line + "\n", style="gray75"))
+            ))
+            self._rendered = (self.lines, body)
+        return Group(Text(f"{self.name} {bar}", style="orange3"), body)
+
+    def open_log(self, log_dir, compress=False):
+        self.log_path = Path(log_dir) / f"{self.name}.log{'.gz' if compress else ''}"
+        opener = gzip.open if compress else open
+        self._log = opener(self.log_path, "wt", encoding="utf-8")
+        return self._log
+
+    def read_log(self):
+        """ Full output from the log file, or what's left in memory if there's none """
+        if not self.log_path:
+            yield from self._buffer
+            return
+        opener = gzip.open if self.log_path.suffix == ".gz" else open
+        with opener(self.log_path, "rt", encoding="utf-8") as f:
+            for line in f:
+                yield line.rstrip("\n")
+
+    def skip(self, cancelled=False):
+        self.skipped = True
+        self.cancelled = cancelled
+        self.done.set()
+
+    def cancel(self):
+        self.cancelled = True
+        if self.process and self.process.returncode is None:
+            with suppress(ProcessLookupError):
+                self.process.kill()
+
+    def result(self, capture=False):
+        """ Result of the command, the whole stdout is read back from the log only if `capture` """
+        return Result(
+            name=self.name,
+            command=self.line,
+            repo=self.repo,
+            version=self.version,
+            returncode=self.process.returncode if self.process else None,
+            stdout="\n".join(self.read_log()) if capture else None,
+            stderr="\n".join(self._stderr),
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            duration=self.finished_at - self.started_at if self.finished_at else None,
+            attempts=self.attempts,
+            outcome=self.outcome,
+        )
+
+    async def read(self, stream, queue, stderr=False):
+        reader = LineReader()
+        while chunk := await stream.read(CHUNK_SIZE):
+            if lines := reader.feed(chunk):
+                await queue.put([self.name, lines, stderr])
+        if lines := reader.feed(b"", final=True):
+            await queue.put([self.name, lines, stderr])
+
+    async def note(self, queue, line):
+        """ Messages about the command itself go along stderr, so they never end up in stdout """
+        await queue.put([self.name, [line], not self.output])
+
+    async def attempt(self, queue):
+        self.attempts += 1
+        self.timed_out = False
         self.process = await asyncio.create_subprocess_exec(
             *self.command,
             stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.STDOUT if self.output else None,
+            stderr=asyncio.subprocess.STDOUT if self.output else asyncio.subprocess.PIPE,
             cwd=self.cwd,
         )
-        while chunk := await self.process.stdout.read(2 ** 18):
-            await queue.put([self.name, chunk.decode().strip()])
+        try:
+            await asyncio.wait_for(asyncio.gather(
+                self.read(self.process.stdout, queue),
+                *([] if self.output else [self.read(self.process.stderr, queue, stderr=True)]),
+            ), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out = True
+            with suppress(ProcessLookupError):
+                self.process.kill()
+            await self.note(queue, f"Timed out after {self.timeout}s")
+        await self.process.wait()
+
+    async def run(self, queue):
+        """ Run the command, retrying with exponential backoff if it's allowed to """
+        self.started_at = time.time()
+        try:
+            while not self.cancelled:
+                await self.attempt(queue)
+                if not self.failed or self.cancelled or self.attempts > self.retries:
+                    break
+                delay = min(BACKOFF * 2 ** (self.attempts - 1), MAX_BACKOFF)
+                await self.note(queue, f"Attempt {self.attempts} failed, retrying in {delay}s")
+                await asyncio.sleep(delay)
+        finally:
+            self.finished_at = time.time()
+            self.done.set()
         return self.process
 
 
 def render(commands, live):
-    render = []
-    for name, command in commands.items():
-        items = []
-        title = ' '.join(command.command)
-        bar = f"{title} {'-' * (100 - len(title))}"
-        items.append(Text(f"{name} {bar}", style="orange3"))
-        min_idx = max(len(command._buffer) - command.MAX_LINES, 1)
-        items.append(Text.assemble(*(
-            item
-            for idx, line in enumerate(command._buffer[min_idx:], min_idx)
-            for item in (Text(f"{idx:03}  ", style="dim"), Text(line + "\n", style="gray75"))
-        )))
-        render.append(Group(*items))
-    live.update(Group(*render))
+    live.update(Group(*(command.render() for command in commands.values())))
     live.refresh()
 
 
+def consume(commands, item):
+    name, lines, stderr = item
+    commands[name].extend(lines, stderr=stderr)
+
+
 async def render_loop(commands, queue, live):
+    """
+        Consume the output until `None` is queued, after all the commands.
+        Chunks are coalesced and rendered at most FPS times per second.
+    """
+    loop = asyncio.get_running_loop()
     while True:
-        item = None
-        with suppress(TimeoutError):
-            item = await asyncio.wait_for(queue.get(), timeout=0.2)
-        if item:
-            name, content = item
-            for line in content.split("\n"):
-                commands[name].append(line)
+        next_frame = loop.time() + 1 / FPS
+        with suppress(asyncio.TimeoutError):
+            while (timeout := next_frame - loop.time()) > 0:
+                if queue.empty():
+                    item = await asyncio.wait_for(queue.get(), timeout=timeout)
+                else:
+                    item = queue.get_nowait()
+                if not item:
+                    render(commands, live)
+                    return
+                consume(commands, item)
         render(commands, live)
 
 
@@ -88,26 +397,93 @@ def async_wrapper(f):
     return internal
 
 
-@async_wrapper
-async def run(*commands, repos=None, cwd=None, header=True, versions=None, output=True):
-
-    if isinstance(commands, str):
-        commands = [commands]
-    if repos:
-        def make_commands(commands, repos):
-            commands = [
-                x.replace("{path}", str(repo.path))
-                 .replace("{remote}", repo.remote)
-                 .replace("{branch}", repo.branch)
-                 .replace("{version}", version)
-                 for x in commands
-                 for repo_name, repo in repos.items()
-                 for version in (versions or [""])
-            ]
-            return commands
-
-        commands = make_commands(commands, repos)
+def expand(template, repo=None, version=None):
+    if not repo:
+        return template
+    return (
+        template.replace("{path}", str(repo.path))
+                .replace("{remote}", repo.remote)
+                .replace("{branch}", repo.branch)
+                .replace("{version}", version)
+    )
+
+
+def expand_lines(template, repo_name=None, repo=None, version=None):
+    """
+        Command lines of a template for a target. A template is either a string,
+        or a callable getting (repo_name, repo, version) and returning any number of lines.
+    """
+    if not callable(template):
+        return [expand(template, repo, version)]
+    lines = template(repo_name, repo, version)
+    return [lines] if isinstance(lines, str) else list(lines or [])
+
 
+def make_commands(pipelines, cwd, output, repos=None, versions=None):
+    """
+        Each pipeline is a list of stages, each stage a template or a tuple of templates, see `expand_lines`.
+        For every repo (and version), a stage starts when its previous stage is done,
+        independently from the other repos.
+    """
+    targets = [
+        (repo_name, repo, version)
+        for repo_name, repo in repos.items()
+        for version in (versions or [""])
+    ] if repos else [(None, None, None)]
+
+    commands = {}
+    for pipeline in pipelines:
+        for repo_name, repo, version in targets:
+            previous = []
+            for stage in pipeline:
+                current = []
+                for template in (stage if isinstance(stage, tuple) else (stage,)):
+                    for line in expand_lines(template, repo_name, repo, version):
+                        name = str(len(commands) + 1)
+                        commands[name] = Command(
+                            name=name,
+                            cwd=cwd,
+                            command=line,
+                            output=output,
+                            after=previous,
+                            repo=repo_name,
+                            version=version or None,
+                        )
+                        current.append(commands[name])
+                # a stage may have nothing to do for this target
+                previous = current or previous
+    return commands
+
+
+@async_wrapper
+async def run(
+    *commands,
+    repos=None,
+    cwd=None,
+    header=True,
+    versions=None,
+    output=True,
+    jobs=None,
+    limits=None,
+    summary=True,
+    log_dir=None,
+    compress=False,
+    console=None,
+    fail_fast=None,
+    check=False,
+):
+    """
+        Run commands in parallel, showing their live output, and return their `Result`s.
+        A list argument is a pipeline of stages, see `make_commands`.
+        Only the tail of each output is kept in memory, the whole of it is logged
+        to `log_dir` (a temporary folder if not given) and read back for the
+        final summary, or into the results' stdout if `output` is False.
+        With `output`, stderr is merged into stdout.
+        Commands are killed after their resource class timeout, network ones are
+        retried, see `TIMEOUTS` and `RETRIES`. With `fail_fast` the first failure
+        cancels all the other commands. Failures are listed at the end if there's
+        some `output` or with `check`, which also exits with a non-zero status.
+    """
     cwd = cwd or os.path.abspath(os.path.curdir)  # noqa: ASYNC240
     if not commands:
         handle_non_interactive()
@@ -116,45 +492,73 @@ async def run(*commands, repos=None, cwd=None, header=True, versions=None, outpu
             for line in sys.stdin.read().split("\n")
             if (stripped := line.rstrip())
         ]
-    else:
-        commands = list(commands)
+
+    json_output = JSON_OUTPUT
+    if json_output:
+        header = summary = False
+    pipelines = [x if isinstance(x, list) else [x] for x in commands]
+    commands = make_commands(pipelines, cwd, output and not json_output, repos, versions)
 
     if header:
-        for command in commands:
-            print(f"$ {command}")
+        for command in commands.values():
+            prefix = f"(after {','.join(x.name for x in command.after)}) " if command.after else ''
+            print(f"$ {prefix}{command.line}")
         print(80 * '-')
 
-    commands = {
-        name: Command(name=name, cwd=cwd, command=line, output=output)
-        for idx, line in enumerate(commands, 1)
-        if (name := str(idx))
-    }
-
-    Console()
-    queue = asyncio.Queue()
-    with Live(transient=True, screen=False) as live:
-        render_task = asyncio.create_task(
-            render_loop(commands, queue, live)
-        )
+    with ExitStack() as stack:
+        if not log_dir:
+            log_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix="pl-"))
+        for command in commands.values():
+            stack.enter_context(command.open_log(log_dir, compress=compress))
 
-        await asyncio.gather(
-            *[cmd.run(queue) for name, cmd in commands.items()],
+        scheduler = Scheduler(
+            JOBS if jobs is None else jobs,
+            {**LIMITS, **(limits or {})},
+            fail_fast=FAIL_FAST if fail_fast is None else fail_fast,
         )
-        render(commands, live)
-        render_task.cancel()
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        console = console or Console(stderr=json_output)
+        with Live(console=console, transient=True, screen=False, auto_refresh=False) as live:
+            render_task = asyncio.create_task(
+                render_loop(commands, queue, live)
+            )
 
-        live.update("")
+            await asyncio.gather(
+                *[scheduler.run(cmd, queue) for name, cmd in commands.items()],
+            )
+            await queue.put(None)
+            await render_task
 
-    stream = sys.stdout if output else io.StringIO()
-    for _idx, command in commands.items():
-        for line in command._buffer:
-            print(line, file=stream)
-        print(file=stream)
+            live.update("")
 
-    if not output:
-        stream.seek(0)
-        return stream.read()
-    return None
+        for command in commands.values():
+            command._log.close()
+
+        if output and summary:
+            for command in commands.values():
+                for line in command.read_log():
+                    print(line)
+                print()
+
+        failed = [command for command in commands.values() if command.failed]
+        if failed and (output or check):
+            print(f"{len(failed)} of {len(commands)} commands failed:", file=sys.stderr)
+            for command in failed:
+                returncode = command.process.returncode if command.process else None
+                details = ', '.join(filter(None, [
+                    command.outcome,
+                    f"exit {returncode}" if returncode else None,
+                    f"{command.attempts} attempts" if command.attempts > 1 else None,
+                ]))
+                print(f"  {command.name} [{details}] {command.line}", file=sys.stderr)
+
+        results = [command.result(capture=not output or json_output) for command in commands.values()]
+        if json_output:
+            for result in results:
+                print(json.dumps(result._asdict()))
+        if failed and check:
+            sys.exit(1)
+        return results
 
 
 if __name__ == "__main__":
@@ -25,21 +25,25 @@ def create_template(name, db_name):
 
 class Project(JsonMixin):
 
-    def __init__(self, name, path, last_used):
+    def __init__(self, name, path, last_used, worktrees=0):
         self.name = name
         self.path = path
         self.last_used = last_used or 'master'
+        # Workspaces kept checked out in their own worktrees, 0 to share the project's checkouts
+        self.worktrees = worktrees
 
     @classmethod
     def from_json(cls, data):
         return Project(data.get('name'),
                        str(data.get('path')),
-                       data.get('last_used'))
+                       data.get('last_used'),
+                       int(data.get('worktrees') or 0))
 
     def to_json(self):
         data = {'name': self.name,
                 'path': str(self.path),
-                'last_used': self.last_used}
+                'last_used': self.last_used,
+                'worktrees': self.worktrees}
         return json.dumps(data, indent=4)
 
 
@@ -67,7 +71,9 @@ class Projects(JsonMixin, dict):
 
     @classmethod
     def load(cls, path):
-        return Projects.load_json(path) or Projects(path=path)
+        if Path(path).exists():
+            return Projects.load_json(path)
+        return Projects(path=path)
 
     def save(self):
         ensure(self.path.parent)
@@ -1,3 +1,4 @@
+from consts import CLEAN_KEEP
 from json_mixin import JsonMixin
 
 
@@ -9,8 +10,16 @@ class Repo(JsonMixin):
             setattr(self, key, value)
         self.path = None
 
+    @property
+    def clean_keep(self):
+        """ Patterns of the untracked files `git clean` leaves, from `keep` in the workspace file """
+        keep = getattr(self, 'keep', None)
+        return CLEAN_KEEP if keep is None else keep
+
     def __copy__(self):
         repo = Repo(self.remote, self.branch)
+        if (keep := getattr(self, 'keep', None)) is not None:
+            repo.keep = list(keep)
         if self.path:
             repo.path = str(self.path)
         return repo
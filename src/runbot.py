@@ -1,6 +1,5 @@
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
-import requests
 import json
 from external import External
 
@@ -13,6 +12,7 @@ class Runbot(External):
 
     @classmethod
     def _request(cls, kind, name):
+        import requests
         return json.loads(requests.get(Runbot.make_url(kind, name)).content.decode())
 
     @classmethod
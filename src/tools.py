@@ -1,17 +1,21 @@
 from pathlib import Path
 
 import paths
-from git import Git
+from git import FetchPlan, Git, GitError, RefIndex, RepoWorker, strip_remote
 from odev import odev
 from pgsql import PgSql
 from project import Project, create_template
 from repo import Repo
 from templates import template_repos, main_repos, origins, post_hook_template
-from workspace import Workspace
+from workspace import Workspace, cleanup_colon  # noqa: F401
+from worktrees import Worktrees
+import warmup
 
 import consts
+from completion import NameIndex
 from datetime import datetime
-import questionary
+from contextlib import suppress
+from functools import lru_cache
 import shutil
 import re
 import sys
@@ -30,10 +34,15 @@ def strtobool(value):
         return False
     return None
 
-custom_style = questionary.Style.from_dict({
-    "completion-menu": "bg:#222222",
-    "answer": "fg:#ffffee nobold",
-})
+
+@lru_cache(maxsize=1)
+def custom_style():
+    # questionary pulls in prompt_toolkit, only import it when prompting
+    import questionary
+    return questionary.Style.from_dict({
+        "completion-menu": "bg:#222222",
+        "answer": "fg:#ffffee nobold",
+    })
 
 
 # Pure tools ---------------------------------------------------
@@ -55,6 +64,7 @@ def cat(fullpath, encoding="UTF-8"):
 
 def select_project(action, project_name=None):
     if not project_name:
+        import questionary
         choices = [questionary.Choice(project.path, value=project.name) for project in odev.projects.values()]
         project_name = select("project", action, choices, select_function=questionary.select)
         if not project_name:
@@ -92,12 +102,6 @@ def set_last_used(last_used, project=odev.project):
 
 # Workspace handling ------------------------------------------
 
-def cleanup_colon(name):
-    if name and ":" in name:
-        return name.split(":")[1]
-    return name
-
-
 def _extract_version(branch_name):
     base = (
         re.match(r"(?P<name>(?P<major>\d{1,2}).(?P<minor>\d))", branch_name)
@@ -113,14 +117,52 @@ def get_venv_path(version):
         case _:
             return ".venv310"
 
-def find_base(repo_name, branch):
+def find_base(repo_name, branch, depth=None, shallow_since=None):
+    """
+        Base version of a bundle's branch, the version whose fork point from master is their merge base.
+        The branch is only fetched, as shallow as asked, if its tracking ref isn't the tip `ls-remote`
+        finds, or last found if the remote can't be reached. A tip is only resolved once, the cache is keyed by it.
+    """
     fallback = _extract_version(branch)['name']
     arbitrary_path = odev.paths.project / repo_name
     have_dev_origin = [k for k, v in origins.items() if 'dev' in v]
     remote = 'dev' if repo_name in have_dev_origin else 'origin'
-    Git.fetch(arbitrary_path, repo_name, remote, branch)
-    bundle_merge_base = Git.merge_base(arbitrary_path, 'master', f'{remote}/{branch}')
-    return getattr(odev.merge_cache, repo_name, {}).get(bundle_merge_base, fallback)
+    ref = f'refs/remotes/{remote}/{branch}'
+    remote_tip = Git.sync(Git.remote_tip_async(arbitrary_path, remote, branch, refresh=True))
+    if not (tip := Git.rev_parse(arbitrary_path, ref)) or (remote_tip and tip != remote_tip):
+        FetchPlan(depth, shallow_since).add(repo_name, remote, branch).fetch({repo_name: arbitrary_path})
+        index_branches([repo_name])
+        tip = Git.rev_parse(arbitrary_path, ref)
+    if version := odev.merge_cache.base(repo_name, tip):
+        return version
+    bundle_merge_base = Git.merge_base(arbitrary_path, 'origin/master', f'{remote}/{branch}')
+    if not (version := odev.merge_cache.base(repo_name, bundle_merge_base)):
+        return fallback
+    odev.merge_cache.remember(repo_name, tip, version)
+    odev.merge_cache.save_json(odev.paths.cache)
+    return version
+
+
+def update_merge_cache(repo_paths):
+    """
+        Index the fork points from master of the versions whose tip moved since the last update,
+        computed concurrently across repositories and versions.
+    """
+    cache = odev.merge_cache
+
+    async def fork_point(repo_name, path, version, tip):
+        with suppress(GitError):
+            cache.set_fork_point(repo_name, version, tip, await Git.merge_base_async(path, 'origin/master', tip))
+
+    coroutines = []
+    for repo_name, path in repo_paths.items():
+        worker = RepoWorker.get(path)
+        tips = {version: worker.resolve(f'refs/remotes/origin/{version}') for version in cache.versions}
+        coroutines += [fork_point(repo_name, path, version, tips[version]) for version in cache.moved(repo_name, tips)]
+    Git.gather(coroutines)
+    cache.save_json(odev.paths.cache)
+    return len(coroutines)
+
 
 def workspace_prepare(
     workspace_name=None,
@@ -161,6 +203,84 @@ def workspace_install(workspace):
     odev.reload_workspaces()
 
 
+def index_branches(repo_names):
+    """
+        Refresh the remote branches of the branch index if the refs changed, i.e. after a fetch.
+        Returns the index.
+    """
+    branch_index = odev.branch_index()
+    for repo_name in repo_names:
+        if (path := odev.paths.repo(repo_name)).is_dir():
+            signature = RefIndex.signature(path)
+            if branch_index.signatures.get(repo_name) != signature:
+                branch_index.set_branches(repo_name, RefIndex.remote_refs(path, signature), signature)
+    return branch_index
+
+
+def remote_branches(repo_name, remote=None):
+    """ Branches from the branch index, only read again from the refs if they changed """
+    return strip_remote(index_branches([repo_name]).branches.get(repo_name, []), remote)
+
+
+def warmup_workspace(workspace, modules_only=False):
+    """
+        Precompile the bytecode of the workspace in the background, with its virtualenv's interpreter.
+        With `modules_only`, only that of its modules and their dependencies.
+    """
+    python = odev.paths.project / workspace.venv_path / 'bin' / 'python'
+    if not python.is_file():
+        return None
+    folders = warmup.targets(workspace, workspace.modules if modules_only else None)
+    return warmup.start(odev.paths.warmup(workspace.name), python, folders)
+
+
+def materialize_worktrees(workspace):
+    """
+        Create the missing worktrees of the workspace, from the repositories of the project.
+        A branch already checked out in another worktree is checked out detached.
+    """
+    missing = {repo_name: repo for repo_name, repo in workspace.repos.items() if not Path(repo.path).is_dir()}
+    if not missing:
+        return
+    main_paths = {repo_name: odev.paths.project / repo_name for repo_name in missing}
+    plan = FetchPlan()
+    for repo_name, repo in missing.items():
+        plan.add(repo_name, repo.remote, repo.branch)
+    plan.fetch(main_paths)
+
+    async def add(repo_name, repo):
+        checked_out = (await Git.worktree_list_async(main_paths[repo_name])).values()
+        await Git.worktree_add_async(
+            main_paths[repo_name], repo.path, repo.branch, f"{repo.remote}/{repo.branch}",
+            detach=repo.branch in checked_out,
+        )
+    Git.gather(add(repo_name, repo) for repo_name, repo in missing.items())
+
+
+def evict_worktrees(current=None, in_use=None):
+    """
+        Remove the worktrees of the least recently used workspaces, beyond the number the project keeps.
+        Those with changes are kept, as well as those of `current`, just used, and `in_use`.
+    """
+    worktrees = Worktrees.load(odev.paths.worktrees)
+    if current:
+        worktrees.touch(current)
+    for workspace_name in worktrees.evictable(odev.project.worktrees, current, in_use):
+        root = odev.paths.worktree(workspace_name)
+        repo_paths = {repo_name: root / repo_name for repo_name in paths.dir_names(root)} if root.is_dir() else {}
+        if dirty := Git.find_dirty(repo_paths, untracked=True):
+            print(f"Worktrees of {workspace_name} kept, {', '.join(dirty)} have changes", file=sys.stderr)
+            continue
+        Git.gather(
+            Git.worktree_remove_async(odev.paths.project / repo_name, path)
+            for repo_name, path in repo_paths.items()
+        )
+        shutil.rmtree(root, ignore_errors=True)
+        worktrees.forget(workspace_name)
+    paths.ensure(odev.paths.workspaces)
+    worktrees.save()
+
+
 def move_workspace(workspace_name, dest_workspace_name):
     path = odev.paths.workspace_file(workspace_name)
     dest_path = odev.paths.workspace(workspace_name) / Path(f"{dest_workspace_name}.json")
@@ -174,10 +294,12 @@ def move_workspace(workspace_name, dest_workspace_name):
     path = odev.paths.workspace(workspace_name)
     dest_path = odev.paths.workspace(dest_workspace_name)
     shutil.move(path, dest_path)
+    odev.reload_workspaces()
 
 
 def delete_workspace(workspace_name):
     shutil.rmtree(odev.paths.workspace(workspace_name))
+    odev.reload_workspaces()
 
 
 def select_new_workspace():
@@ -186,7 +308,7 @@ def select_new_workspace():
 
 def select_workspace(action, project):
     workspaces = odev.workspaces + ['last']
-    result = select("workspace", action, workspaces, questionary.autocomplete)
+    result = select("workspace", action, workspaces, autocomplete)
     if result is None:
         sys.exit(1)
     if not result or result == 'last':
@@ -208,6 +330,7 @@ def select_repos_and_branches(project, action, checked=None, workspace=None):
 def select_repositories(action, workspace=None, checked=None):
     repos = workspace.repos if workspace else template_repos
     if checked:
+        import questionary
         choices = [questionary.Choice(x, checked=(x in checked)) for x in repos]
     else:
         choices = repos
@@ -221,6 +344,7 @@ def select_repository(action, workspace=None, repo_names=None):
     else:
         repo_choices = {repo_name: repo for repo_name, repo in all_repos.items() if repo_name in repo_names}
 
+    import questionary
     repo_name = select("repository", action, repo_choices, select_function=questionary.select)
     if repo_name:
         repo = repo_choices[repo_name]
@@ -230,9 +354,10 @@ def select_repository(action, workspace=None, repo_names=None):
 # Remotes -----------------------------------------------------
 
 def select_remote(action, remote=None, context=None):
-    return remote or select("remote", action, ["origin", "dev"],
-                            select_function=questionary.select,
-                            context=context)
+    if remote:
+        return remote
+    import questionary
+    return select("remote", action, ["origin", "dev"], select_function=questionary.select, context=context)
 
 
 # Modules -----------------------------------------------------
@@ -244,13 +369,12 @@ def select_modules():
 def select_branch(project, repo_name, action, choices=None, remote=None):
     if not choices:
         remote = select_remote(action, remote, context=repo_name)
-        path = odev.paths.repo(repo_name)
-        choices = Git.get_remote_branches(path, remote)
+        choices = remote_branches(repo_name, remote)
     prefix = f"{repo_name} > " if not remote else f"{repo_name}/{remote} > "
-    branch = questionary.autocomplete(
+    branch = autocomplete(
         f"{prefix}Which branch do you want to {action}?",
         choices=choices,
-        style=custom_style,
+        style=custom_style(),
         qmark=consts.QMARK
     ).ask()
     if branch:
@@ -259,11 +383,13 @@ def select_branch(project, repo_name, action, choices=None, remote=None):
 
 # Database name --------------------------------------------
 def select_db_name():
+    db_names = PgSql.db_names()
+    odev.index.set_db_names(db_names)
     return select(
         "database",
         "use",
-        PgSql.db_names(),
-        questionary.autocomplete,
+        db_names,
+        autocomplete,
         default=odev.projects.defaults['db_name'],
     )
 
@@ -272,18 +398,50 @@ def select_db_name():
 def select_venv(workspace):
     venvs = [str(f) for f in Path(odev.project.path).glob(".venv*") if f.is_dir()]
     return (
-        select("venv", "select", venvs, questionary.autocomplete)
+        select("venv", "select", venvs, autocomplete)
         or workspace.venv_path
     )
 
 
 # Questionary helpers --------------------------------------
 
+@lru_cache(maxsize=8)
+def name_index(names):
+    return NameIndex(names)
+
+
+@lru_cache(maxsize=1)
+def name_completer():
+    """ Completer class ranking the matches with a `NameIndex`, instead of filtering all the choices """
+    from prompt_toolkit.completion import Completer, Completion
+
+    class NameCompleter(Completer):
+
+        def __init__(self, names, limit=50):
+            self.index = name_index(tuple(names))
+            self.limit = limit
+
+        def get_completions(self, document, complete_event):
+            text = document.text_before_cursor
+            for name in self.index.search(text, limit=self.limit):
+                yield Completion(name, start_position=-len(text))
+
+    return NameCompleter
+
+
+def autocomplete(message, choices, **kwargs):
+    import questionary
+    NameCompleter = name_completer()
+    return questionary.autocomplete(message, choices=choices, completer=NameCompleter(choices), **kwargs)
+
+
 def input_text(text):
-    return questionary.text(text, style=custom_style, qmark=consts.QMARK).ask()
+    import questionary
+    return questionary.text(text, style=custom_style(), qmark=consts.QMARK).ask()
 
 
 def checkbox(subject, action, choices):
+    import questionary
     return select(subject, action, choices, questionary.checkbox)
 
 
@@ -291,16 +449,19 @@ def select(
     subject,
     action,
     choices,
-    select_function=questionary.rawselect,
+    select_function=None,
     context=None,
     default=None
 ):
+    if select_function is None:
+        import questionary
+        select_function = questionary.rawselect
     prefix = f"{context} > " if context else ''
     default_str = f" ({default})" if default else ''
     result = select_function(
         f"{prefix}Which {subject} do you want to {action}?{default_str}",
         choices=choices,
-        style=custom_style,
+        style=custom_style(),
         qmark=consts.QMARK,
     ).ask()
     if result is None:
@@ -315,6 +476,7 @@ def select(
 
 
 def confirm(action):
+    import questionary
     return questionary.confirm(f"Are you sure you want to {action}?",
-                               style=custom_style,
+                               style=custom_style(),
                                qmark=consts.QMARK).ask()
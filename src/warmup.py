@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+    Background bytecode precompilation of a workspace, so that the first start of Odoo
+    doesn't compile its modules one after the other.
+
+    `start` runs this file as a detached process. It runs `compileall` with a process pool in
+    the workspace's virtualenv, whose interpreter has the bytecode magic Odoo runs with, then
+    writes in a report how long it took and the CPU time the compilation used.
+"""
+
+import ast
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from paths import atomic_write
+
+MANIFESTS = ('__manifest__.py', '__openerp__.py')
+
+
+def module_paths(folders, modules):
+    """ {module: folder} of `modules` and of their dependencies, found in the addons `folders` """
+    found = {}
+    to_do = list(modules)
+    while to_do:
+        if (module := to_do.pop()) in found:
+            continue
+        manifests = (Path(folder) / module / name for folder in folders for name in MANIFESTS)
+        if manifest := next((x for x in manifests if x.is_file()), None):
+            to_do.extend(ast.literal_eval(manifest.read_text(encoding='utf-8')).get('depends', []))
+        found[module] = manifest and manifest.parent
+    return {module: folder for module, folder in found.items() if folder}
+
+
+def targets(workspace, modules=None):
+    """
+        Folders to precompile: the `odoo` package and the addons paths of the workspace,
+        or only the `modules` and their dependencies out of the addons.
+    """
+    root = Path(workspace.path)
+    folders = [root / x for x in sorted(workspace.addons_path)]
+    if modules is None:
+        return [root / 'odoo' / 'odoo', *folders]
+    package = [x for x in (root / 'odoo' / 'odoo').iterdir() if x.name != 'addons']
+    return [*package, *module_paths(folders, modules).values()]
+
+
+def start(report_path, python, folders):
+    """ Precompile the `folders` with the `python` interpreter, in a process detached from the terminal """
+    Path(report_path).unlink(missing_ok=True)
+    return subprocess.Popen(
+        [sys.executable, __file__, str(report_path), str(python), *map(str, folders)],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def summary(report_path):
+    """ Line about the last precompilation, None if there was none. Once finished, it's only told once. """
+    try:
+        report = json.loads(Path(report_path).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+    if 'finished' not in report:
+        try:
+            os.kill(report['pid'], 0)
+        except OSError:
+            return None
+        return f"still precompiling, for {time.time() - report['started']:.0f}s"
+    Path(report_path).unlink(missing_ok=True)
+    return (
+        f"precompiled in {report['finished'] - report['started']:.1f}s in the background,"
+        f" {report['cpu']:.1f}s of CPU time across the pool"
+        f"{', some files could not be compiled' if report['returncode'] else ''}"
+    )
+
+
+def main():
+    report_path, python, *folders = sys.argv[1:]
+    started = time.time()
+    atomic_write(report_path, json.dumps({'pid': os.getpid(), 'started': started}))
+    proc = subprocess.run(
+        [python, '-m', 'compileall', '-q', '-j', '0', *folders],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False,
+    )
+    # CPU time of the compilation, summed over the processes of the pool
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    atomic_write(report_path, json.dumps({
+        'pid': os.getpid(),
+        'started': started,
+        'finished': time.time(),
+        'cpu': usage.ru_utime + usage.ru_stime,
+        'returncode': proc.returncode,
+    }))
+
+
+if __name__ == '__main__':
+    main()
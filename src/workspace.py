@@ -4,6 +4,12 @@ from json_mixin import JsonMixin
 from templates import addons_path, upgrade_path
 
 
+def cleanup_colon(name):
+    if name and ":" in name:
+        return name.split(":")[1]
+    return name
+
+
 class Workspace(JsonMixin):
 
     def __init__(
@@ -0,0 +1,43 @@
+import time
+from pathlib import Path
+
+from json_mixin import JsonMixin
+
+
+class Worktrees(JsonMixin):
+    """
+        Workspaces materialised as one `git worktree` per repository, with the time they were last used.
+        Only the most recently used ones are kept on disk.
+    """
+
+    def __init__(self, path=None, used=None):
+        self.path = path
+        self.used = used or {}
+
+    @classmethod
+    def load(cls, path):
+        worktrees = cls.load_json(path) or cls()
+        worktrees.path = path
+        return worktrees
+
+    def to_json_excluded(self):
+        return ['path'] + super().to_json_excluded()
+
+    def save(self):
+        return self.save_json(Path(self.path))
+
+    def touch(self, name):
+        self.used[name] = time.time()
+
+    def forget(self, name):
+        self.used.pop(name, None)
+
+    def by_use(self):
+        """ [(name, last used)], most recent first """
+        return sorted(((name, float(used)) for name, used in self.used.items()), key=lambda x: -x[1])
+
+    def evictable(self, keep, current=None, in_use=None):
+        """ Names of the workspaces beyond the `keep` most recently used, `current` and `in_use` being kept in any case """
+        kept = {current, in_use} - {None}
+        names = [name for name, _used in self.by_use() if name not in kept]
+        return names[max(keep - len(kept), 0):]
@@ -0,0 +1,152 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).absolute().parent.parent
+OCLI = ROOT / 'ocli'
+
+# runs `ocli` with the arguments after the first, then writes the imported modules in the first,
+# `run_path` sets `sys.argv[0]` to the script so that the completion variable is `_OCLI_COMPLETE`
+DRIVER = f"""
+import atexit, json, runpy, sys
+modules_path, sys.argv = sys.argv[1], sys.argv[1:]
+atexit.register(lambda: open(modules_path, 'w').write(json.dumps(sorted(sys.modules))))
+runpy.run_path({str(OCLI)!r}, run_name='__main__')
+"""
+
+
+class CliTestCase(unittest.TestCase):
+    """ Runs `ocli` in a scratch project, with its own home """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.home, self.project = Path(self.tmp.name) / 'home', Path(self.tmp.name) / 'project'
+        self.home.mkdir()
+        self.project.mkdir()
+        self.env = {
+            **os.environ,
+            'HOME': str(self.home),
+            'PYTHONPATH': str(ROOT / 'src'),
+            'ODEV_NO_DAEMON': '1',
+        }
+        self.ocli('project-create')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def ocli(self, *args, env=None):
+        """ Completed process of `ocli *args`, with the `modules` it imported """
+        modules_path = Path(self.tmp.name) / 'modules.json'
+        proc = subprocess.run(
+            [sys.executable, '-c', DRIVER, str(modules_path), *args],
+            cwd=self.project, env={**self.env, **(env or {})}, stdin=subprocess.DEVNULL,
+            capture_output=True, text=True, check=False, timeout=60,
+        )
+        proc.modules = set(json.loads(modules_path.read_text()))
+        return proc
+
+
+class TestLazyGroup(CliTestCase):
+
+    def test_commands_loaded_on_demand(self):
+        proc = self.ocli('path', '--help')
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        commands = {x for x in proc.modules if x.startswith('commands.')}
+        self.assertIn('commands.path', commands)
+        self.assertNotIn('commands.git', commands)
+        self.assertNotIn('commands.odoo', commands)
+
+    def test_no_prompt_or_task_imports(self):
+        for group in ('git', 'workspace', 'odoo'):
+            proc = self.ocli(group, '--help')
+            self.assertEqual(proc.returncode, 0, proc.stderr)
+            self.assertIn(f'commands.{group}', proc.modules)
+            imported = {x.split('.')[0] for x in proc.modules}
+            self.assertFalse(imported & {'questionary', 'prompt_toolkit', 'invoke', 'requests'}, group)
+
+
+class TestCompletion(CliTestCase):
+
+    def complete(self, line, shell='bash'):
+        if shell == 'bash':
+            words = line.split()
+            env = {'COMP_WORDS': line, 'COMP_CWORD': str(len(words) - (not line.endswith(' ')))}
+        else:
+            env = {'_TYPER_COMPLETE_ARGS': line}
+        return self.ocli(env={'_OCLI_COMPLETE': f'complete_{shell}', **env})
+
+    def test_workspace_names(self):
+        # the group isn't indexed yet, the command line handling answers and indexes it
+        proc = self.complete('ocli workspace load ma')
+        self.assertEqual((proc.returncode, proc.stdout, proc.stderr), (0, 'master\n', ''))
+        self.assertIn('commands.workspace', proc.modules)
+        self.assertFalse({'questionary', 'prompt_toolkit', 'invoke'} & proc.modules)
+
+        proc = self.complete('ocli workspace load --warmup none ')
+        self.assertEqual((proc.returncode, proc.stdout), (0, 'master\n'))
+        self.assertFalse({'typer', 'click', 'commands.workspace'} & proc.modules)
+
+        proc = self.complete('ocli workspace load ma', shell='zsh')
+        self.assertEqual(proc.stdout, '''_arguments '*: :(("master"))'\n''')
+        proc = self.complete('ocli workspace load zz', shell='zsh')
+        self.assertEqual(proc.stdout, '_files\n')
+        self.assertNotIn('typer', proc.modules)
+
+    def test_branches(self):
+        self.complete('ocli odoo bundle ')
+        # kept apart from the index every command loads
+        index = next(self.home.glob('.config/odev/index/*.json'))
+        branches = [f'dev/17.0-fix-{i}' for i in range(1000)]
+        index.with_suffix('.branches.json').write_text(json.dumps({'branches': {'odoo': branches}, 'signatures': {}}))
+        proc = self.complete('ocli odoo bundle 17.0-fix-99')
+        self.assertEqual(proc.stdout.split(), ['17.0-fix-99', *(f'17.0-fix-99{i}' for i in range(10))])
+        self.assertNotIn('typer', proc.modules)
+        self.assertNotIn('fix', index.read_text())
+
+    def test_falls_back(self):
+        self.complete('ocli workspace load ')
+        # not a parameter value, or the workspaces changed since they were indexed
+        proc = self.complete('ocli workspace lo')
+        self.assertEqual(proc.stdout, 'load\n')
+        self.assertIn('typer', proc.modules)
+        next(self.home.glob('.config/odev/workspaces/*/master')).with_name('other').mkdir()
+        proc = self.complete('ocli workspace load ')
+        self.assertEqual(proc.stdout, 'master\nother\n')
+        self.assertIn('typer', proc.modules)
+
+
+class TestDaemon(CliTestCase):
+
+    def setUp(self):
+        super().setUp()
+        socket_path = self.home / '.config' / 'odev' / 'daemon.sock'
+        self.daemon = subprocess.Popen(
+            [sys.executable, str(ROOT / 'src' / 'daemon.py')],
+            cwd=self.project, env=self.env, stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while not socket_path.exists() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertTrue(socket_path.exists())
+
+    def tearDown(self):
+        self.daemon.terminate()
+        self.daemon.wait(10)
+        super().tearDown()
+
+    def test_forward(self):
+        # run by the server, with the client's file descriptors
+        proc = self.ocli('path', 'projects', env={'ODEV_NO_DAEMON': ''})
+        self.assertEqual((proc.returncode, proc.stdout), (0, f"{self.home / '.config' / 'odev' / 'projects.json'}\n"))
+        self.assertFalse({'typer', 'odev'} & proc.modules)
+
+        proc = self.ocli('path', 'workspace', 'missing', env={'ODEV_NO_DAEMON': ''})
+        self.assertEqual(proc.returncode, 1)
+        self.assertIn("missing", proc.stderr)
+        self.assertFalse({'typer', 'odev'} & proc.modules)
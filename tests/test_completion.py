@@ -0,0 +1,28 @@
+import unittest
+
+from completion import NameIndex
+
+
+class TestNameIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = NameIndex([
+            "master",
+            "17.0",
+            "17.0-fix-stock-abc",
+            "saas-17.2-stock-move-xyz",
+            "saas-17.2-account-abc",
+            "16.0-17.0-forward-port-abc",
+        ])
+
+    def test_token_prefixes(self):
+        self.assertEqual(self.index.search("saas- abc"), ["saas-17.2-account-abc"])
+        self.assertEqual(self.index.search("STOCK"), ["17.0-fix-stock-abc", "saas-17.2-stock-move-xyz"])
+        self.assertEqual(self.index.search("acc 17.2"), ["saas-17.2-account-abc"])
+        self.assertEqual(self.index.search("zzz"), [])
+
+    def test_ranking(self):
+        # names starting with the query first, then the shortest ones
+        self.assertEqual(self.index.search("17.0"), ["17.0", "17.0-fix-stock-abc", "16.0-17.0-forward-port-abc"])
+        self.assertEqual(self.index.search("", limit=2), ["17.0", "master"])
+        self.assertEqual(len(self.index.search("abc", limit=2)), 2)
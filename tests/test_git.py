@@ -0,0 +1,217 @@
+import asyncio
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from git import MERGE_BASES, FetchPlan, Git, GitError, LsRemoteCache, RefIndex, RepoWorker
+from paths import prune_bytecode
+from worktrees import Worktrees
+
+
+class TestGit(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name)
+        for args in (['init', '-q', '-b', 'master'], ['config', 'user.email', 'a@b.c'], ['config', 'user.name', 'a']):
+            subprocess.run(['git', *args], cwd=self.path, check=True)
+        # larger than a pipe buffer, a process waited before being read would hang
+        (self.path / 'big.txt').write_text("line\n" * 100000)
+        subprocess.run(['git', 'add', '.'], cwd=self.path, check=True)
+        subprocess.run(['git', 'commit', '-qm', 'init'], cwd=self.path, check=True)
+
+    def tearDown(self):
+        RepoWorker.close_all()
+        self.tmp.cleanup()
+
+    def test_large_output(self):
+        proc = Git.sync(Git.git_async(['show', 'HEAD:big.txt'], self.path))
+        self.assertEqual((proc.returncode, len(proc.stdout.splitlines())), (0, 100000))
+
+    def test_lines_and_facade(self):
+        async def count():
+            return sum([1 async for _line in Git.lines_async(['show', 'HEAD:big.txt'], self.path)])
+        self.assertEqual(Git.sync(count()), 100000)
+        self.assertEqual(Git.get_current_branch(self.path), 'master')
+        self.assertEqual(Git.gather(Git.status_async(self.path) for _idx in range(3))[0].stdout, '')
+        with self.assertRaises(GitError):
+            Git.merge_base(self.path, 'master', 'nonexistent')
+
+    def test_cancel_kills_process(self):
+        async def inner():
+            task = asyncio.create_task(Git.git_async(['-c', 'alias.wait=!sleep 5', 'wait'], self.path))
+            await asyncio.sleep(0.2)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        loop = asyncio.new_event_loop()
+        start = loop.time()
+        loop.run_until_complete(inner())
+        self.assertLess(loop.time() - start, 5)
+        loop.close()
+
+    def test_worker(self):
+        head = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=self.path, capture_output=True, text=True).stdout.strip()
+        self.assertEqual(Git.rev_parse(self.path, 'master'), head)
+        self.assertIsNone(Git.rev_parse(self.path, 'nonexistent'))
+        subprocess.run(['git', 'checkout', '-qb', 'feature'], cwd=self.path, check=True)
+        self.assertEqual(Git.get_current_branch(self.path), 'feature')
+        self.assertEqual(Git.merge_base(self.path, 'master', 'feature'), head)
+        self.assertIn((str(self.path), head, head), MERGE_BASES)
+        worker = RepoWorker.get(self.path)
+        self.assertIs(RepoWorker.get(self.path), worker)
+        RepoWorker.close_all()
+        self.assertIsNot(RepoWorker.get(self.path), worker)
+
+    def test_find_dirty(self):
+        clean = Path(self.tmp.name + '-clone')
+        subprocess.run(['git', 'clone', '-q', str(self.path), str(clean)], check=True)
+        try:
+            (self.path / 'big.txt').write_text("changed\n")
+            (self.path / 'new file.txt').write_text("new\n")
+            paths = {'dirty': self.path, 'clean': clean}
+            self.assertEqual(Git.find_dirty(paths), {'dirty': ['big.txt']})
+            self.assertEqual(Git.find_dirty(paths, untracked=True), {'dirty': ['big.txt', 'new file.txt']})
+            self.assertEqual(Git.find_dirty({'clean': clean}, untracked=True), {})
+        finally:
+            shutil.rmtree(clean)
+
+    def test_status_info(self):
+        clone = Path(self.tmp.name + '-clone')
+        subprocess.run(['git', 'clone', '-q', str(self.path), str(clone)], check=True)
+        try:
+            for args in (['config', 'user.email', 'a@b.c'], ['config', 'user.name', 'a'], ['commit', '-q', '--allow-empty', '-m', 'ahead']):
+                subprocess.run(['git', *args], cwd=clone, check=True)
+            (clone / 'big.txt').write_text("changed\n")
+            (clone / 'new.txt').write_text("new\n")
+            info = Git.sync(Git.status_info_async(clone))
+            self.assertEqual(
+                {k: info[k] for k in ('branch', 'upstream', 'ahead', 'behind', 'staged', 'unstaged', 'untracked', 'subject')},
+                dict(branch='master', upstream='origin/master', ahead=1, behind=0, staged=0, unstaged=1, untracked=1, subject='ahead'),
+            )
+        finally:
+            shutil.rmtree(clone)
+
+    def test_ref_index(self):
+        clone = Path(self.tmp.name + '-clone')
+        subprocess.run(['git', 'clone', '-q', str(self.path), str(clone)], check=True)
+        try:
+            subprocess.run(['git', 'pack-refs', '--all'], cwd=clone, check=True)
+            self.assertEqual(Git.remote_refs(clone), ['origin/master'])
+            signature = RefIndex.signature(clone)
+            subprocess.run(['git', 'branch', '-q', 'feature/one'], cwd=self.path, check=True)
+            subprocess.run(['git', 'fetch', '-q', 'origin'], cwd=clone, check=True)
+            self.assertNotEqual(RefIndex.signature(clone), signature)
+            self.assertEqual(Git.get_remote_branches(clone, 'origin'), ['feature/one', 'master'])
+            expected = subprocess.run(
+                ['git', 'for-each-ref', '--format=%(refname:lstrip=2)', 'refs/remotes'],
+                cwd=clone, capture_output=True, text=True, check=True,
+            ).stdout.split()
+            self.assertEqual(Git.remote_refs(clone), [x for x in expected if not x.endswith('/HEAD')])
+        finally:
+            shutil.rmtree(clone)
+
+    def test_ls_remote_cache(self):
+        clone = Path(self.tmp.name + '-clone')
+        subprocess.run(['git', 'clone', '-q', str(self.path), str(clone)], check=True)
+        try:
+            with patch.dict(os.environ, {'HOME': str(clone / 'home')}):
+                subprocess.run(['git', 'branch', '-q', '17.0'], cwd=self.path, check=True)
+                self.assertEqual(Git.all_remote_branches(clone, 'origin'), ['17.0'])
+                subprocess.run(['git', 'branch', '-q', 'saas-17.2'], cwd=self.path, check=True)
+                self.assertEqual(Git.all_remote_branches(clone, 'origin'), ['17.0'])
+                self.assertEqual(Git.all_remote_branches(clone, 'origin', refresh=True), ['17.0', 'saas-17.2'])
+                self.assertEqual(Git.get_remote_branches(clone, 'origin', worktree=True), ['17.0', 'master', 'saas-17.2'])
+                # offline
+                subprocess.run(['git', 'remote', 'set-url', 'origin', '/nonexistent'], cwd=clone, check=True)
+                with patch('sys.stderr'):
+                    self.assertEqual(Git.all_remote_branches(clone, 'origin', refresh=True), ['17.0', 'saas-17.2'])
+                LsRemoteCache.load().clear()
+                with self.assertRaises(GitError):
+                    Git.all_remote_branches(clone, 'origin')
+        finally:
+            shutil.rmtree(clone)
+
+    def test_fetch_plan(self):
+        clone = Path(self.tmp.name + '-clone')
+        subprocess.run(['git', 'clone', '-q', '--single-branch', str(self.path), str(clone)], check=True)
+        try:
+            with patch.dict(os.environ, {'HOME': str(clone / 'home')}):
+                for branch in ('17.0', 'saas-17.2'):
+                    subprocess.run(['git', 'branch', '-q', branch], cwd=self.path, check=True)
+                plan = FetchPlan().add('odoo', 'origin', '17.0', 'saas-17.2').add('odoo', 'origin', '17.0')
+                [stage] = plan.stages()
+                [command] = stage('odoo', SimpleNamespace(path=clone), None)
+                self.assertEqual(command.split()[3:], [
+                    'fetch', 'origin', '+refs/heads/17.0:refs/remotes/origin/17.0',
+                    '+refs/heads/saas-17.2:refs/remotes/origin/saas-17.2',
+                ])
+                with patch('sys.stderr'):
+                    Git.sync(plan.fetch_async({'odoo': clone}))
+                self.assertEqual(Git.remote_refs(clone), ['origin/17.0', 'origin/master', 'origin/saas-17.2'])
+                # fetching doesn't tell the remote tips
+                self.assertEqual(len(FetchPlan().add('odoo', 'origin', '17.0').refspecs('odoo', clone)), 1)
+                # tips seen by ls-remote are already there
+                Git.get_remote_branches(clone, 'origin', worktree=True)
+                self.assertEqual(plan.refspecs('odoo', clone), {})
+                self.assertEqual(len(FetchPlan(refresh=True).add('odoo', 'origin', '17.0').refspecs('odoo', clone)), 1)
+        finally:
+            shutil.rmtree(clone)
+
+    def test_worktrees(self):
+        worktree = self.path / '.worktrees' / 'ws' / 'repo'
+        Git.worktree_add(self.path, worktree, 'feature', 'master')
+        self.assertEqual(Git.get_current_branch(worktree), 'feature')
+        other = self.path / '.worktrees' / 'other' / 'repo'
+        Git.worktree_add(self.path, other, 'feature', 'master', detach=True)
+        self.assertEqual(Git.rev_parse(other, 'HEAD'), Git.rev_parse(self.path, 'master'))
+        self.assertEqual(
+            Git.sync(Git.worktree_list_async(self.path)),
+            {str(self.path): 'master', str(worktree): 'feature', str(other): None},
+        )
+        Git.sync(Git.worktree_remove_async(self.path, other))
+        self.assertEqual(list(Git.sync(Git.worktree_list_async(self.path))), [str(self.path), str(worktree)])
+
+        worktrees = Worktrees(used={'a': 3, 'b': 2, 'c': 1})
+        self.assertEqual(worktrees.evictable(2), ['c'])
+        self.assertEqual(worktrees.evictable(2, current='c'), ['b'])
+        self.assertEqual(worktrees.evictable(2, current='d'), ['b', 'c'])
+        self.assertEqual(worktrees.evictable(1, current='c', in_use='b'), ['a'])
+
+    def test_clean_keeps_caches(self):
+        (self.path / 'mod.py').write_text("")
+        subprocess.run(['git', 'add', 'mod.py'], cwd=self.path, check=True)
+        for name in ('__pycache__/mod.cpython-311.pyc', '__pycache__/gone.cpython-311.pyc', 'old/__pycache__/x.cpython-311.pyc'):
+            (self.path / name).parent.mkdir(parents=True, exist_ok=True)
+            (self.path / name).write_text("")
+        (self.path / 'junk.txt').write_text("")
+        Git.sync(Git.clean_async(self.path, quiet=True, keep=['__pycache__']))
+        self.assertFalse((self.path / 'junk.txt').exists())
+        self.assertEqual(prune_bytecode(self.path), 2)
+        self.assertEqual(sorted(x.name for x in (self.path / '__pycache__').iterdir()), ['mod.cpython-311.pyc'])
+        self.assertFalse((self.path / 'old').exists())
+
+    def test_shallow_merge_base(self):
+        commit = ['git', '-c', 'user.email=a@b.c', '-c', 'user.name=a', 'commit', '-q', '--allow-empty', '-m', 'c']
+        subprocess.run(['git', 'checkout', '-qb', 'feature'], cwd=self.path, check=True)
+        for _idx in range(3):
+            subprocess.run(commit, cwd=self.path, check=True)
+        subprocess.run(['git', 'checkout', '-q', 'master'], cwd=self.path, check=True)
+        for _idx in range(100):
+            subprocess.run(commit, cwd=self.path, check=True)
+        fork_point = Git.merge_base(self.path, 'master', 'feature')
+        shallow = Path(self.tmp.name + '-shallow')
+        subprocess.run(['git', 'init', '-q', str(shallow)], check=True)
+        subprocess.run(['git', 'remote', 'add', 'origin', f'file://{self.path}'], cwd=shallow, check=True)
+        try:
+            with patch.dict(os.environ, {'HOME': str(shallow / 'home')}), patch('sys.stderr'):
+                FetchPlan(depth=1).add('repo', 'origin', 'master', 'feature').fetch({'repo': shallow})
+                self.assertTrue(Git.sync(Git.is_shallow_async(shallow)))
+                self.assertEqual(Git.merge_base(shallow, 'origin/master', 'origin/feature'), fork_point)
+        finally:
+            shutil.rmtree(shallow)
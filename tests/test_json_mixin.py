@@ -0,0 +1,87 @@
+import multiprocessing
+import tempfile
+import unittest
+from pathlib import Path
+
+from completion import CompletionIndex
+from json_mixin import merge
+from project import Project, Projects
+
+
+def update_index(path, barrier, kind, names):
+    """ Load the index, wait for the other process to have loaded it too, then change it """
+    index = CompletionIndex.load(path)
+    barrier.wait()
+    if kind == 'db_names':
+        index.set_db_names(names)
+    else:
+        index.set_workspaces(names, None)
+
+
+class TestProjectsStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tempdir.name) / 'projects.json'
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_save_only_when_dirty(self):
+        projects = Projects.load(self.path)
+        self.assertTrue(projects.save())
+        projects = Projects.load(self.path)
+        self.assertFalse(projects.is_dirty())
+        self.assertFalse(projects.save())
+
+        projects['abc'] = Project('abc', '/tmp/abc', 'master')
+        self.assertTrue(projects.save())
+        projects = Projects.load(self.path)
+        projects['abc'].last_used = '17.0'
+        self.assertTrue(projects.is_dirty())
+        self.assertTrue(projects.save())
+        self.assertEqual(Projects.load(self.path)['abc'].last_used, '17.0')
+
+    def test_atomic_write_leaves_no_temp_files(self):
+        Projects.load(self.path).save()
+        names = sorted(x.name for x in self.path.parent.iterdir())
+        self.assertEqual(names, ['projects.json', 'projects.json.lock'])
+
+    def test_concurrent_updates_are_merged(self):
+        path = Path(self.tempdir.name) / 'index.json'
+        index = CompletionIndex.load(path)
+        index.set_workspaces(['master'], None)
+        index.set_db_names(['db'])
+        context = multiprocessing.get_context('fork')
+        barrier = context.Barrier(2)
+        processes = [
+            context.Process(target=update_index, args=(path, barrier, 'db_names', ['db-a'])),
+            context.Process(target=update_index, args=(path, barrier, 'workspaces', ['17.0'])),
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(30)
+            self.assertEqual(process.exitcode, 0)
+        index = CompletionIndex.load(path)
+        self.assertEqual((index.workspaces, index.db_names), (['17.0'], ['db-a']))
+
+    def test_save_keeps_the_changes_saved_meanwhile(self):
+        Projects.load(self.path).save()
+        ours, theirs = Projects.load(self.path), Projects.load(self.path)
+        theirs['abc'] = Project('abc', '/tmp/abc', 'master')
+        theirs.save()
+        ours['def'] = Project('def', '/tmp/def', 'master')
+        ours.save()
+        self.assertEqual(sorted(Projects.load(self.path)), ['abc', 'def'])
+        # the object took them, saving again doesn't drop them
+        self.assertEqual(ours['abc'].path, '/tmp/abc')
+        del ours['def']
+        ours.save()
+        self.assertEqual(sorted(Projects.load(self.path)), ['abc'])
+
+    def test_merge(self):
+        base = {'a': 1, 'b': {'x': 1, 'y': 1}, 'c': 1}
+        ours = {'a': 2, 'b': {'x': 2, 'y': 1}}
+        theirs = {'a': 1, 'b': {'x': 1, 'y': 3}, 'c': 1, 'd': 4}
+        self.assertEqual(merge(base, ours, theirs), {'a': 2, 'b': {'x': 2, 'y': 3}, 'd': 4})
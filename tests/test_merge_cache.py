@@ -0,0 +1,91 @@
+import os
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import tools
+from git import Git, RepoWorker
+from merge_cache import MergeCache
+from odev import odev
+
+
+class TestMergeCache(unittest.TestCase):
+
+    def test_index(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'cache.json'
+            path.write_text('{"versions": ["17.0", "18.0"], "odoo": {"f17": "17.0"}}')
+            cache = MergeCache.load(path)
+            self.assertEqual(cache.base('odoo', 'f17'), '17.0')
+            self.assertEqual(cache.moved('odoo', {'17.0': 't17', '18.0': 't18', 'saas-18.1': None}), ['17.0', '18.0'])
+            cache.set_fork_point('odoo', '17.0', 't17', 'f17b')
+            cache.remember('odoo', 'bundle', '17.0')
+            cache.save_json(path)
+
+            cache = MergeCache.load(path)
+            self.assertEqual(cache.moved('odoo', {'17.0': 't17', '18.0': 't18'}), ['18.0'])
+            self.assertEqual((cache.base('odoo', 'f17'), cache.base('odoo', 'f17b')), (None, '17.0'))
+            self.assertEqual(cache.base('odoo', 'bundle'), '17.0')
+            self.assertEqual(MergeCache.load(Path(tmp) / 'missing.json').versions, [])
+
+
+class TestFindBase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        tmp = Path(self.tmp.name)
+        self.remote, self.path = tmp / 'remote', tmp / 'odoo'
+        self.git('init', '-q', '-b', 'master', str(self.remote), cwd=tmp)
+        self.commit('m1')
+        self.git('branch', '17.0')
+        self.commit('m2')
+        self.git('branch', '18.0')
+        self.git('checkout', '-q', '-b', '17.0-fix', '17.0')
+        self.commit('f1')
+        self.git('clone', '-q', str(self.remote), str(self.path), cwd=tmp)
+        self.git('remote', 'add', 'dev', str(self.remote), cwd=self.path)
+        self.git('fetch', '-q', 'dev', cwd=self.path)
+
+        merge_cache = MergeCache(versions=['17.0', '18.0'])
+        for version in merge_cache.versions:
+            merge_cache.set_fork_point('odoo', version, self.tip(version), self.tip(version))
+        self.patches = [
+            patch.dict(os.environ, {'HOME': str(tmp)}),
+            patch.object(odev, 'merge_cache', merge_cache, create=True),
+            patch.object(odev, 'paths', SimpleNamespace(
+                project=tmp, cache=tmp / 'cache.json', branches=tmp / 'index.branches.json',
+                repo=lambda repo_name: tmp / repo_name,
+            )),
+        ]
+        for x in self.patches:
+            x.start()
+
+    def tearDown(self):
+        for x in reversed(self.patches):
+            x.stop()
+        RepoWorker.close_all()
+        self.tmp.cleanup()
+
+    def git(self, *args, cwd=None):
+        subprocess.run(
+            ['git', '-c', 'user.email=a@b.c', '-c', 'user.name=a', *args],
+            cwd=cwd or self.remote, check=True, capture_output=True,
+        )
+
+    def commit(self, message):
+        self.git('commit', '-q', '--allow-empty', '-m', message)
+
+    def tip(self, branch):
+        return Git.rev_parse(self.remote, f'refs/heads/{branch}')
+
+    def test_remote_moved(self):
+        self.assertEqual(tools.find_base('odoo', '17.0-fix'), '17.0')
+        # rebased on 18.0, the tracking ref of the clone is stale
+        self.git('checkout', '-q', '-B', '17.0-fix', '18.0')
+        self.commit('f2')
+        with patch('sys.stdout'):
+            self.assertEqual(tools.find_base('odoo', '17.0-fix'), '18.0')
+        self.assertEqual(Git.rev_parse(self.path, 'refs/remotes/dev/17.0-fix'), self.tip('17.0-fix'))
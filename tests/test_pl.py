@@ -0,0 +1,202 @@
+import asyncio
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from rich.console import Console
+
+import pl
+
+
+class TestScheduler(unittest.TestCase):
+
+    def run_commands(self, lines, jobs=None, limits=None, fail_fast=False):
+        async def inner():
+            scheduler = pl.Scheduler(jobs, limits, fail_fast=fail_fast)
+            queue = asyncio.Queue()
+            commands = [pl.Command(str(idx), '.', line, output=False) for idx, line in enumerate(lines)]
+            await asyncio.gather(*[scheduler.run(command, queue) for command in commands])
+            return commands
+        with patch.object(pl, 'RETRIES', 0):
+            return asyncio.run(inner())
+
+    def assertSequential(self, commands):
+        spans = sorted((x.started_at, x.finished_at) for x in commands)
+        for (_start, end), (next_start, _end) in zip(spans, spans[1:]):
+            self.assertGreaterEqual(next_start, end)
+
+    def test_global_limit(self):
+        self.assertSequential(self.run_commands(["sleep 0.1"] * 3, jobs=1))
+
+    def test_resource_limit(self):
+        commands = self.run_commands(
+            ["git -C /nonexistent fetch"] * 3 + ["sleep 0.1"] * 2,
+            limits={"network": 1},
+        )
+        self.assertEqual([x.resource for x in commands], ["network"] * 3 + ["disk"] * 2)
+        self.assertSequential(commands[:3])
+
+    def test_fail_fast(self):
+        commands = self.run_commands(["sleep 5", "false", "sleep 0.1"], jobs=2, fail_fast=True)
+        self.assertEqual([x.outcome for x in commands], ["cancelled", "failed", "cancelled"])
+        self.assertTrue(commands[2].skipped)
+        self.assertLess(commands[0].finished_at - commands[0].started_at, 5)
+
+    def test_configure(self):
+        jobs, limits = pl.JOBS, dict(pl.LIMITS)
+        try:
+            pl.configure("3,network=2,disk=0")
+            self.assertEqual(pl.JOBS, 3)
+            self.assertEqual(pl.LIMITS, {"network": 2, "disk": None})
+            with self.assertRaises(ValueError):
+                pl.configure("network=many")
+        finally:
+            pl.JOBS, pl.LIMITS = jobs, limits
+
+
+class TestPipelines(unittest.TestCase):
+
+    def test_stages_run_in_order_and_skip_after_failure(self):
+        commands = pl.make_commands([[("true", "sleep 0.1"), "false", "true"]], '.', output=False)
+        self.assertEqual([x.name for x in commands['3'].after], ['1', '2'])
+
+        async def inner():
+            scheduler = pl.Scheduler()
+            await asyncio.gather(*[scheduler.run(x, asyncio.Queue()) for x in commands.values()])
+        asyncio.run(inner())
+
+        self.assertGreaterEqual(commands['3'].started_at, commands['2'].finished_at)
+        self.assertTrue(commands['3'].failed)
+        self.assertTrue(commands['4'].skipped)
+        self.assertIsNone(commands['4'].started_at)
+
+    def test_callable_stages(self):
+        repos = {'odoo': SimpleNamespace(path='.', remote='origin', branch='master')}
+        commands = pl.make_commands([[
+            lambda repo_name, _repo, _version: ["true", "true"] if repo_name == 'odoo' else None,
+            "echo {branch}",
+        ]], '.', output=False, repos=repos)
+        self.assertEqual([x.line for x in commands.values()], ["true", "true", "echo master"])
+        self.assertEqual([x.name for x in commands['3'].after], ['1', '2'])
+        commands = pl.make_commands([[lambda *_args: None, "true"]], '.', output=False)
+        self.assertEqual(commands['1'].after, [])
+
+
+class TestPolicies(unittest.TestCase):
+
+    def run_command(self, line):
+        async def inner():
+            command = pl.Command('1', '.', line, output=False)
+            await command.run(asyncio.Queue())
+            return command
+        return asyncio.run(inner())
+
+    def test_timeout(self):
+        with patch.dict(pl.TIMEOUTS, {"disk": 0.1}):
+            command = self.run_command("sleep 5")
+        self.assertEqual((command.outcome, command.attempts), ("timeout", 1))
+        self.assertLess(command.finished_at - command.started_at, 5)
+
+    def test_network_retries_with_backoff(self):
+        with patch.object(pl, 'BACKOFF', 0.05):
+            command = self.run_command("git ls-remote /nonexistent")
+            self.assertEqual((command.outcome, command.attempts), ("failed", pl.RETRIES + 1))
+            self.assertGreaterEqual(command.finished_at - command.started_at, 0.05 * (2 ** pl.RETRIES - 1))
+            self.assertEqual(self.run_command("false").attempts, 1)
+
+
+class TestOutput(unittest.TestCase):
+
+    def test_ring_buffer_spills_to_log(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            command = pl.Command('1', '.', 'true', output=True)
+            with command.open_log(log_dir, compress=True):
+                for idx in range(1000):
+                    command.append(str(idx))
+            self.assertEqual(len(command._buffer), command.RING_LINES)
+            self.assertEqual(command.lines, 1000)
+            self.assertEqual(list(command.read_log()), [str(x) for x in range(1000)])
+
+    def test_render_loop_caps_the_frame_rate(self):
+        command = pl.Command('1', '.', 'true', output=True)
+        frames = []
+        live = SimpleNamespace(update=lambda _renderable: None, refresh=lambda: frames.append(command.lines))
+
+        async def produce(queue):
+            for idx in range(50):
+                await queue.put(['1', [str(idx)] * 10, False])
+                await asyncio.sleep(0.01)
+            await queue.put(None)
+
+        async def inner():
+            queue = asyncio.Queue()
+            started = time.monotonic()
+            await asyncio.gather(pl.render_loop({'1': command}, queue, live), produce(queue))
+            return time.monotonic() - started
+
+        with patch.object(pl, 'FPS', 20):
+            duration = asyncio.run(inner())
+        # rendered while the output comes in, chunks coalesced into at most FPS frames a second
+        self.assertLessEqual(len(frames), duration * 20 + 2)
+        self.assertGreater(len(frames), 3)
+        self.assertTrue(0 < frames[0] < 500)
+        self.assertEqual(frames, sorted(frames))
+        self.assertEqual(frames[-1], 500)
+        # without new lines, the output tail isn't built again
+        body = command.render().renderables[1]
+        self.assertIs(command.render().renderables[1], body)
+
+    def test_stderr_is_bounded(self):
+        command = pl.Command('1', '.', 'true', output=True)
+        command.extend([str(x) for x in range(1000)], stderr=True)
+        self.assertEqual(list(command._stderr), [str(x) for x in range(1000 - command.RING_LINES, 1000)])
+
+
+class TestResults(unittest.TestCase):
+
+    def test_structured_results(self):
+        with open(os.devnull, 'w') as devnull:
+            results = pl.run(
+                "sh -c 'echo {version}; echo oops >&2'",
+                "false",
+                repos={'odoo': SimpleNamespace(path='.', remote='origin', branch='master')},
+                versions=['17.0'],
+                header=False,
+                output=False,
+                console=Console(file=devnull),
+            )
+        self.assertEqual([x.returncode for x in results], [0, 1])
+        self.assertEqual((results[0].repo, results[0].version), ('odoo', '17.0'))
+        self.assertEqual((results[0].stdout, results[0].stderr), ('17.0', 'oops'))
+        self.assertGreaterEqual(results[0].duration, 0)
+
+    def test_messages_leave_json_stdout(self):
+        with patch.object(pl, 'JSON_OUTPUT', True), redirect_stdout(io.StringIO()) as stdout, redirect_stderr(io.StringIO()) as stderr:
+            pl.echo("odoo: up to date")
+            pl.run("true", header=False, console=Console(file=io.StringIO()))
+        self.assertEqual(stderr.getvalue(), "odoo: up to date\n")
+        self.assertEqual(json.loads(stdout.getvalue())['returncode'], 0)
+
+
+class TestLineReader(unittest.TestCase):
+
+    def test_chunk_boundaries_and_progress(self):
+        data = "héllo wörld\nRecv 1%\rRecv 50%\rRecv 100%, done.\r\n  indented\nlast".encode()
+        reader = pl.LineReader()
+        lines = []
+        for idx in range(len(data)):
+            lines += reader.feed(data[idx:idx + 1])
+        lines += reader.feed(b"", final=True)
+        self.assertEqual(lines, ["héllo wörld", "Recv 100%, done.", "  indented", "last"])
+
+    def test_progress_without_newline_stays_small(self):
+        reader = pl.LineReader()
+        for idx in range(10000):
+            reader.feed(f"{idx}%\r".encode())
+        self.assertEqual(reader.partial, "9999%\r")
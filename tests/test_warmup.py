@@ -0,0 +1,41 @@
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+import warmup
+
+
+class TestWarmup(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name)
+        for module, depends in (('base', []), ('mail', ['base']), ('sale', ['mail']), ('stock', ['base'])):
+            (self.path / 'odoo' / 'addons' / module).mkdir(parents=True)
+            (self.path / 'odoo' / 'addons' / module / '__manifest__.py').write_text(repr({'depends': depends}))
+            (self.path / 'odoo' / 'addons' / module / 'models.py').write_text("x = 1\n")
+        (self.path / 'odoo' / 'odoo').mkdir()
+        (self.path / 'odoo' / 'odoo' / 'fields.py').write_text("y = 2\n")
+        self.workspace = SimpleNamespace(path=str(self.path), addons_path={Path('odoo') / 'addons'})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_targets(self):
+        addons = self.path / 'odoo' / 'addons'
+        self.assertEqual(warmup.module_paths([addons], ['sale', 'missing']), {
+            'sale': addons / 'sale', 'mail': addons / 'mail', 'base': addons / 'base',
+        })
+        self.assertEqual(warmup.targets(self.workspace), [self.path / 'odoo' / 'odoo', addons])
+        self.assertEqual(len(warmup.targets(self.workspace, ['stock'])), 3)
+
+    def test_background_compilation(self):
+        report = self.path / 'warmup.json'
+        warmup.start(report, sys.executable, warmup.targets(self.workspace, ['mail'])).wait(timeout=60)
+        self.assertTrue((self.path / 'odoo' / 'addons' / 'mail' / '__pycache__').is_dir())
+        self.assertFalse((self.path / 'odoo' / 'addons' / 'stock' / '__pycache__').exists())
+        self.assertIn("of CPU time", warmup.summary(report))
+        # told once
+        self.assertIsNone(warmup.summary(report))
@@ -0,0 +1,46 @@
+import os
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pl
+from commands.workspace import _plan_switch
+from git import Git, RepoWorker
+
+
+class TestSwitchPlan(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.remote, self.path = Path(self.tmp.name) / 'remote', Path(self.tmp.name) / 'odoo'
+        subprocess.run(['git', 'init', '-q', '-b', '17.0', str(self.remote)], check=True)
+        self.commit()
+        subprocess.run(['git', 'clone', '-q', str(self.remote), str(self.path)], check=True)
+        self.repos = {'odoo': SimpleNamespace(path=str(self.path), remote='origin', branch='17.0')}
+        self.home = patch.dict(os.environ, {'HOME': self.tmp.name})
+        self.home.start()
+
+    def tearDown(self):
+        self.home.stop()
+        RepoWorker.close_all()
+        self.tmp.cleanup()
+
+    def commit(self):
+        subprocess.run(
+            ['git', '-c', 'user.email=a@b.c', '-c', 'user.name=a', 'commit', '-q', '--allow-empty', '-m', 'c'],
+            cwd=self.remote, check=True,
+        )
+        return Git.rev_parse(self.remote, 'HEAD')
+
+    def test_remote_moved(self):
+        with patch('sys.stdout'):
+            self.assertEqual(_plan_switch(self.repos)[1], {'odoo': None})
+            tip = self.commit()
+            for refresh in (False, True):
+                plan, actions = _plan_switch(self.repos, refresh=refresh)
+                self.assertEqual(actions, {'odoo': "fetch origin/17.0, clean and switch"})
+            pl.run(plan.stages(), repos=self.repos, output=False, check=True)
+        self.assertEqual(Git.rev_parse(self.path, 'refs/remotes/origin/17.0'), tip)